@@ -0,0 +1,134 @@
+# costcache.py
+# 代价模型缓存：解析模型（理论拍数/建议 Wv/带宽估算）与完整无头仿真的结果按参数记忆化。
+#   - 键：kind + 场景 + 规范化参数 + MODEL_VERSION 的 SHA-1（参数按名排序、数值统一成 int/float，顺序与写法无关）；
+#     模型口径变化时递增 MODEL_VERSION，磁盘上旧结果自然失效；
+#   - 内存层：有界 LRU（OrderedDict），统计 hits / misses / disk_hits / evictions；
+#   - 可选磁盘层：sqlite 单表（key -> JSON），每次写入即提交，调优中途崩溃后重跑几乎零代价。
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+import hashlib
+import json
+import sqlite3
+
+from sim import Simulator, scenario_program
+
+
+MODEL_VERSION = 4
+
+
+def _norm(v):
+    if isinstance(v, bool): return int(v)
+    if isinstance(v, float) and v.is_integer(): return int(v)
+    if isinstance(v, (list, tuple)): return [_norm(x) for x in v]
+    if isinstance(v, dict): return {str(k): _norm(x) for k, x in sorted(v.items())}
+    if hasattr(v, "item"): return _norm(v.item())      # numpy 标量
+    return v
+
+
+def canonical_key(kind: str, params: Dict, scenario: str = "") -> str:
+    """同一配置（与参数书写顺序、1.0/1 等写法无关）得到同一个键"""
+    blob = json.dumps({"kind": kind, "scenario": scenario, "params": _norm(params), "v": MODEL_VERSION},
+                      sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+class CostCache:
+    def __init__(self, maxsize: int = 4096, path: Optional[str] = None):
+        self.maxsize = max(1, maxsize)
+        self._mem: "OrderedDict[str, Dict]" = OrderedDict()
+        self.hits = self.misses = self.disk_hits = self.evictions = 0
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS cost (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def __len__(self): return len(self._mem)
+
+    def _remember(self, key: str, value: Dict):
+        self._mem[key] = value
+        self._mem.move_to_end(key)
+        if len(self._mem) > self.maxsize:
+            self._mem.popitem(last=False); self.evictions += 1
+
+    def get(self, key: str) -> Optional[Dict]:
+        v = self._mem.get(key)
+        if v is not None:
+            self._mem.move_to_end(key); self.hits += 1
+            return v
+        if self.db is not None:
+            row = self.db.execute("SELECT value FROM cost WHERE key=?", (key,)).fetchone()
+            if row is not None:
+                v = json.loads(row[0])
+                self._remember(key, v); self.disk_hits += 1
+                return v
+        self.misses += 1
+        return None
+
+    def put(self, key: str, value: Dict):
+        self._remember(key, value)
+        if self.db is not None:
+            self.db.execute("INSERT OR REPLACE INTO cost (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def memo(self, kind: str, params: Dict, fn: Callable[[], Dict], scenario: str = "") -> Dict:
+        """命中则直接返回，否则调用 fn() 计算并写入（结果需可 JSON 序列化）"""
+        key = canonical_key(kind, params, scenario)
+        v = self.get(key)
+        if v is None:
+            v = fn()
+            self.put(key, v)
+        return v
+
+    def stats(self) -> Dict:
+        n = self.hits + self.disk_hits + self.misses
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                "evictions": self.evictions, "size": len(self._mem),
+                "hit_rate": (self.hits + self.disk_hits) / n if n else 0.0}
+
+    def clear(self, disk: bool = False):
+        self._mem.clear()
+        self.hits = self.misses = self.disk_hits = self.evictions = 0
+        if disk and self.db is not None: self.db.execute("DELETE FROM cost")
+
+    def close(self):
+        if self.db is not None:
+            self.db.close(); self.db = None
+
+
+# 进程内默认缓存（仅内存）；需要持久化时自建 CostCache(path=...) 传入
+default_cache = CostCache()
+
+
+def _theory(params: Dict) -> Dict:
+    s = Simulator(**params)
+    bw = {}
+    for stage in ("MTE(L1->L0A)", "MTE(L1->L0B)", "Write C(L1)"):
+        m = s._bandwidth_for_stage(stage, (s.Tm, s.Tn, s.Tk))      # gen_gemm 一条 Feed / 写回的整 tile
+        bw[m["kind"]] = {"bits_per_cycle": m["bits_per_cycle"], "bits": m["bits"], "cycles": m["cycles"]}
+    return {"cube_cycles": s.cube_cycles_theory(), "vector_cycles": s.vector_cycles_theory(),
+            "suggest_Wv": s.suggest_Wv(), "bandwidth": bw}
+
+
+def theory(cache: Optional[CostCache] = None, **params) -> Dict:
+    """解析模型：cube_cycles / vector_cycles / suggest_Wv 与各通路单次搬运的带宽估算"""
+    p = Simulator(**params).params()
+    return (cache if cache is not None else default_cache).memo("theory", p, lambda: _theory(p))
+
+
+def cached_simulate(scenario: str = "GEMM", order: str = "MNK", events: bool = False, q_depth: int = 8,
+                    cache: Optional[CostCache] = None, **params) -> Dict:
+    """按场景名构造程序并无头跑完；同一（场景, 循环顺序, 调度方式, 参数）只仿真一次"""
+    p = Simulator(**params).params()
+    return (cache if cache is not None else default_cache).memo(
+        "simulate", sim_key(p, order, events, q_depth), lambda: run_config(scenario, order, events, q_depth, **p), scenario)
+
+
+def sim_key(params: Dict, order: str, events: bool, q_depth: int) -> Dict:
+    return dict(params, order=order, events=events, q_depth=q_depth if events else 0)
+
+
+def run_config(scenario: str = "GEMM", order: str = "MNK", events: bool = False, q_depth: int = 8, **params) -> Dict:
+    """不经缓存跑一个配置（sweep 的工作进程也用它）"""
+    sim = Simulator(**params)
+    sim.reset(scenario_program(scenario, order=order, **sim.params()))
+    return sim.run_events(q_depth) if events else sim.run()
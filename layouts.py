@@ -0,0 +1,162 @@
+# layouts.py
+# Ascend 数据格式引擎：每种格式 = 作用在「逻辑张量末尾若干维」上的一串索引变换（pad / split / perm / merge），
+# 对逻辑下标数组 arange(...) 依次施加这些变换即得「物理位置 -> 逻辑下标」表（padding 处为 -1）。
+# 任意两种格式之间的转换先合成一张 gather 表（LRU 缓存），再做一次向量化 gather；前导维（batch）原样保留。
+#   ND         (..., H, W)                       逻辑布局本身
+#   FRACTAL_NZ (..., W1, H1, h0, w0)             分形列优先、块内行优先（nz_viewer 的 NZ）
+#   ZZ         (..., H1, W1, h0, w0)             分形行优先、块内行优先
+#   NC1HWC0    (N, C1, H, W, C0)                 由 NCHW，C 按 C0 切分
+#   FRACTAL_Z  (C1·Kh·Kw, N1, N0, C0)            由卷积权重 (Cout, Cin, Kh, Kw)，Cout 按 N0、Cin 按 C0 切分
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Tuple
+import math
+
+import numpy as np
+
+# 变换原语（轴号均为负数，从末尾数起）
+#   ("pad", axis, m)        该轴补到 m 的整数倍
+#   ("split", axis, inner)  该轴 n -> (n // inner, inner)
+#   ("perm", order)         末尾 len(order) 个轴按 order 重排
+#   ("merge", start, stop)  把 [start, stop) 的轴合并成一个（stop=0 表示到末尾）
+
+
+@dataclass(frozen=True)
+class Layout:
+    name: str
+    rank: int                  # 作用的末尾逻辑维数（ND 为 0：任意形状）
+    ops: Tuple = ()
+
+    def __str__(self): return self.name
+
+    def physical_shape(self, shape: Tuple[int, ...]) -> Tuple[int, ...]:
+        s = list(shape)
+        for op in self.ops:
+            if op[0] == "pad":
+                _, ax, m = op
+                s[ax] = math.ceil(s[ax] / m) * m
+            elif op[0] == "split":
+                _, ax, inner = op
+                i = len(s) + ax
+                s[i:i + 1] = [s[i] // inner, inner]
+            elif op[0] == "perm":
+                order = op[1]
+                lead = len(s) - len(order)
+                s = s[:lead] + [s[lead + o] for o in order]
+            else:
+                _, a, b = op
+                i, j = len(s) + a, len(s) + b
+                s[i:j] = [math.prod(s[i:j])]
+        return tuple(s)
+
+    def index(self, shape: Tuple[int, ...]) -> np.ndarray:
+        """物理形状的数组：每个物理位置对应的逻辑行主序下标，padding 为 -1"""
+        if len(shape) < self.rank:
+            raise ValueError(f"{self.name} needs at least {self.rank} dims, got shape {tuple(shape)}")
+        n = math.prod(shape)
+        a = np.arange(n, dtype=np.int32 if n < 2**31 else np.int64).reshape(shape)
+        for op in self.ops:
+            if op[0] == "pad":
+                _, ax, m = op
+                extra = -a.shape[ax] % m
+                if extra:
+                    width = [(0, 0)] * a.ndim
+                    width[ax] = (0, extra)
+                    a = np.pad(a, width, constant_values=-1)
+            elif op[0] == "split":
+                _, ax, inner = op
+                i = a.ndim + ax
+                a = a.reshape(a.shape[:i] + (a.shape[i] // inner, inner) + a.shape[i + 1:])
+            elif op[0] == "perm":
+                order = op[1]
+                lead = a.ndim - len(order)
+                a = a.transpose(tuple(range(lead)) + tuple(lead + o for o in order))
+            else:
+                _, s0, s1 = op
+                i, j = a.ndim + s0, a.ndim + s1
+                a = a.reshape(a.shape[:i] + (-1,) + a.shape[j:])
+        return np.ascontiguousarray(a)
+
+
+# ---- 格式工厂 ----
+def ND() -> Layout: return Layout("ND", 0)
+
+def FRACTAL_NZ(h0: int = 16, w0: int = 16) -> Layout:
+    return Layout(f"NZ{h0}x{w0}", 2, (("pad", -2, h0), ("pad", -1, w0), ("split", -2, h0),
+                                      ("split", -1, w0), ("perm", (2, 0, 1, 3))))
+
+def ZZ(h0: int = 16, w0: int = 16) -> Layout:
+    return Layout(f"ZZ{h0}x{w0}", 2, (("pad", -2, h0), ("pad", -1, w0), ("split", -2, h0),
+                                      ("split", -1, w0), ("perm", (0, 2, 1, 3))))
+
+def NC1HWC0(c0: int = 16) -> Layout:
+    # (N, C, H, W) -> (N, C1, C0, H, W) -> (N, C1, H, W, C0)
+    return Layout(f"NC1HWC0/{c0}", 3, (("pad", -3, c0), ("split", -3, c0), ("perm", (0, 2, 3, 1))))
+
+def FRACTAL_Z(c0: int = 16, n0: int = 16) -> Layout:
+    # (Cout, Cin, Kh, Kw) -> (N1, N0, C1, C0, Kh, Kw) -> (C1, Kh, Kw, N1, N0, C0) -> (C1·Kh·Kw, N1, N0, C0)
+    return Layout(f"FRACTAL_Z/{c0}x{n0}", 4, (("pad", -4, n0), ("pad", -3, c0), ("split", -4, n0),
+                                               ("split", -3, c0), ("perm", (2, 4, 5, 0, 1, 3)),
+                                               ("merge", -6, -3)))
+
+NZ = FRACTAL_NZ
+FORMATS = {"ND": ND, "NZ": FRACTAL_NZ, "FRACTAL_NZ": FRACTAL_NZ, "ZZ": ZZ,
+           "NC1HWC0": NC1HWC0, "FRACTAL_Z": FRACTAL_Z}
+
+
+def get_layout(name: str, **kw) -> Layout:
+    """按名字构造：get_layout("NZ", h0=16, w0=32)"""
+    try:
+        return FORMATS[name.upper()](**kw)
+    except KeyError:
+        raise ValueError(f"unknown format {name!r}, expected one of {sorted(FORMATS)}") from None
+
+
+# ---- 转换 ----
+@lru_cache(maxsize=64)
+def gather_table(src: Layout, dst: Layout, core: Tuple[int, ...]) -> np.ndarray:
+    """
+    core 为参与变换的末尾逻辑形状；返回 dst 物理形状的表：
+    每个 dst 物理位置取 src 物理（展平）下标，padding 为 -1。结果只读、可跨调用复用。
+    """
+    idx_dst = dst.index(core)
+    if not src.ops:
+        table = idx_dst
+    else:
+        idx_src = src.index(core).ravel()
+        inv = np.empty(math.prod(core), dtype=idx_src.dtype)       # 逻辑下标 -> src 物理下标
+        valid = idx_src >= 0
+        inv[idx_src[valid]] = np.flatnonzero(valid).astype(idx_src.dtype)
+        table = np.where(idx_dst >= 0, inv[np.maximum(idx_dst, 0)], -1).astype(idx_src.dtype)
+    table.setflags(write=False)
+    return table
+
+
+def convert(x: np.ndarray, src: Layout, dst: Layout, shape: Tuple[int, ...], pad_val=0) -> np.ndarray:
+    """
+    x 为 src 格式的物理数组，shape 为逻辑（ND）形状；返回 dst 格式的物理数组，dtype 不变。
+    shape 中超出两种格式 rank 的前导维视为 batch，逐 batch 共用同一张 gather 表。
+    """
+    shape = tuple(shape)
+    r = max(src.rank, dst.rank) or len(shape)
+    if len(shape) < r:
+        raise ValueError(f"{src}->{dst} needs at least {r} dims, got shape {shape}")
+    lead, core = shape[:len(shape) - r], shape[len(shape) - r:]
+    if x.shape != lead + src.physical_shape(core):
+        raise ValueError(f"input shape {x.shape} does not match {src} layout of {shape}")
+    table = gather_table(src, dst, core)
+    flat = x.reshape(math.prod(lead), -1)
+    out = flat[:, np.maximum(table, 0).ravel()]
+    pad = table.ravel() < 0
+    if pad.any(): out[:, pad] = pad_val
+    return out.reshape(lead + table.shape)
+
+
+def to_layout(x: np.ndarray, dst: Layout, pad_val=0) -> np.ndarray:
+    """ND -> dst"""
+    return convert(x, ND(), dst, x.shape, pad_val)
+
+
+def from_layout(x: np.ndarray, src: Layout, shape: Tuple[int, ...]) -> np.ndarray:
+    """src -> ND（shape 为逻辑形状）"""
+    return convert(x, src, ND(), shape)
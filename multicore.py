@@ -0,0 +1,81 @@
+# multicore.py
+# 多 AI Core：把 GEMM 的输出 tile (mi, ni) 划分到 N 个核，每个核跑自己的 gen_gemm 子程序
+# （独立的前端、单元队列、flag、L0 槽与 L1->L0 通路），所有核共享一条 L2/GM 链路（l2_bw bits/拍）。
+# 这里把每次 L1<->L0 搬运都视为经过 L2（L1 只做中转、不跨 tile 复用），是共享带宽的保守上界。
+from typing import Dict, List, Optional, Sequence, Tuple
+import math
+
+from sim import Simulator, gen_gemm
+from scheduler import EventScheduler
+
+PARTITIONS = ("block", "cyclic", "grid")
+
+
+def _grid_shape(cores: int, nm: int, nn: int) -> Tuple[int, int]:
+    """pm × pn = cores，尽量让每个核分到的 M/N 块数接近（利于 A/B 复用）"""
+    best = (cores, 1)
+    for pm in range(1, cores + 1):
+        if cores % pm: continue
+        pn = cores // pm
+        if abs(nm / pm - nn / pn) < abs(nm / best[0] - nn / best[1]): best = (pm, pn)
+    return best
+
+
+def partition_tiles(M, N, Tm, Tn, cores: int, policy: str = "block") -> List[List[Tuple[int, int]]]:
+    """
+    输出 tile 划分：
+      block  行优先展开后切成 cores 段连续区间（数量最多差 1）；
+      cyclic 行优先轮转分配；
+      grid   核排成 pm×pn 网格，M/N 块各自按区间切分（每个核只读 A、B 的一部分）。
+    """
+    if policy not in PARTITIONS:
+        raise ValueError(f"unknown partition {policy!r}, expected one of {PARTITIONS}")
+    cores = max(1, cores)
+    nm, nn = math.ceil(M / Tm), math.ceil(N / Tn)
+    tiles = [(mi, ni) for mi in range(nm) for ni in range(nn)]
+    if policy == "cyclic":
+        return [tiles[c::cores] for c in range(cores)]
+    if policy == "block":
+        q, r = divmod(len(tiles), cores)
+        out, lo = [], 0
+        for c in range(cores):
+            hi = lo + q + (1 if c < r else 0)
+            out.append(tiles[lo:hi]); lo = hi
+        return out
+    pm, pn = _grid_shape(cores, nm, nn)
+    bm = [range(nm * i // pm, nm * (i + 1) // pm) for i in range(pm)]
+    bn = [range(nn * j // pn, nn * (j + 1) // pn) for j in range(pn)]
+    return [[(mi, ni) for mi in bm[i] for ni in bn[j]] for i in range(pm) for j in range(pn)]
+
+
+def simulate_multicore(cores: int, l2_bw: Optional[int] = None, policy: str = "block", order: str = "MNK",
+                       q_depth: int = 8, base_cycles: Optional[int] = None, **params) -> Dict:
+    """
+    N 核并发跑一个 GEMM：返回 EventScheduler.run_cores 的统计，另加 speedup（相对实测单核拍数 base_cycles；
+    不给时单独跑一次单核）与各核分到的 tile 数。核数多于 tile 数时多余的核空闲。
+    """
+    sim = Simulator(**params)
+    parts = partition_tiles(sim.M, sim.N, sim.Tm, sim.Tn, cores, policy)
+    programs = [gen_gemm(sim.M, sim.N, sim.K, sim.Tm, sim.Tn, sim.Tk, order, mn=p) if p else iter(())
+                for p in parts]
+    rep = EventScheduler(sim, q_depth=q_depth, l2_bw=l2_bw).run_cores(programs)
+    if base_cycles is None:
+        base_cycles = rep["cycles"] if len(parts) == 1 else \
+            simulate_multicore(1, l2_bw, policy, order, q_depth, **params)["cycles"]
+    rep["tiles"] = [len(p) for p in parts]
+    rep["speedup"] = base_cycles / rep["cycles"] if rep["cycles"] else 0.0
+    return rep
+
+
+def scaling(core_counts: Sequence[int] = (1, 2, 4, 8, 16, 32), l2_bw: Optional[int] = None, **kw) -> List[Dict]:
+    """
+    核数扫描：每个核数一行 {cores, cycles, speedup, efficiency, l2_util}，看共享带宽饱和后曲线何时变平；
+    speedup / efficiency 都以实测单核拍数为基准（efficiency = speedup / cores）。
+    """
+    base = simulate_multicore(1, l2_bw=l2_bw, **kw)["cycles"]
+    rows = []
+    for n in core_counts:
+        r = simulate_multicore(n, l2_bw=l2_bw, base_cycles=base, **kw)
+        rows.append({"cores": n, "cycles": r["cycles"], "speedup": r["speedup"],
+                     "efficiency": r["speedup"] / n, "l2_util": r["l2_util"]})
+    return rows
@@ -0,0 +1,317 @@
+# nz_convert.py
+# 无头 ND <-> NZ 转换（不依赖 Qt）：
+#   - 流式转换：输入输出为 memmap（.npy 或裸二进制），按分形列（W1 slab）分块读写，峰值内存约为 chunk_bytes；
+#   - 命令行批量转换：python nz_convert.py a.npy b.bin ...，文件之间分发到多个进程，报告 GB/s；
+#   - NZ gather 下标缓存：nz_viewer 的 NZ 线性序列（跳过 padding）按形状复用下标表；
+#     流式转换按 slab 做 reshape/transpose，不需要下标表，因此不经过该缓存。
+# NZ 物理形状为 (W1, H1, h0, w0)，与 nz_viewer.nd_to_nz 一致。
+import sys, os, math, time, argparse, tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+
+# ---- NZ 置换索引缓存：同形状张量反复转换时复用 gather 下标（正向 gather / 逆向 scatter 共用一张表） ----
+# 跳过 padding 的 NZ 顺序只取决于 (H, W, w0)：同一分形列内按行、行内按列，h0 只影响 padding 位置。
+PERM_CACHE_SIZE = 64
+PERM_MMAP_BYTES = 256 << 20      # 超过该大小的索引表写入 .npy 并以只读 memmap 打开，不常驻内存
+PERM_MMAP_DIR = None             # None = 系统临时目录；表文件放在其下本进程私有的子目录里
+_perm_cache = OrderedDict()
+_perm_stats = {"hits": 0, "misses": 0}
+_perm_tmp = None                 # 惰性创建的 TemporaryDirectory：淘汰/清空时删单个文件，进程退出时整体删除
+
+def _index_dtype(n):
+    return np.int32 if n <= np.iinfo(np.int32).max else np.int64
+
+def _fill_gather(out, H, W, w0):
+    """逐个分形列（W1 slab）写入索引，峰值内存 ~ H×w0"""
+    rows = np.arange(H, dtype=out.dtype)[:, None] * W
+    k = 0
+    for c0 in range(0, W, w0):
+        slab = (rows + np.arange(c0, min(c0 + w0, W), dtype=out.dtype)[None, :]).ravel()
+        out[k:k + slab.size] = slab
+        k += slab.size
+
+def _perm_dir():
+    global _perm_tmp
+    if _perm_tmp is None:
+        _perm_tmp = tempfile.TemporaryDirectory(prefix="nz_gather_", dir=PERM_MMAP_DIR)
+    return _perm_tmp.name
+
+def _perm_release(idx):
+    """删除被淘汰的 memmap 索引表文件（仍被外部引用、删不掉时留给退出时清理）"""
+    path = getattr(idx, "filename", None)
+    if path:
+        try: os.remove(path)
+        except OSError: pass
+
+def nz_gather_index(H, W, h0, w0):
+    """
+    NZ 顺序（跳过 padding）下第 k 个元素在行主序 ND 中的下标：
+    正向 seq = arr.ravel()[idx]，逆向 out.ravel()[idx] = seq。LRU 缓存，返回只读数组。
+    """
+    dt = _index_dtype(H * W)
+    key = (H, W, w0)
+    idx = _perm_cache.get(key)
+    if idx is not None:
+        _perm_cache.move_to_end(key); _perm_stats["hits"] += 1
+        return idx
+    _perm_stats["misses"] += 1
+    if H * W * np.dtype(dt).itemsize > PERM_MMAP_BYTES:
+        path = os.path.join(_perm_dir(), f"{H}x{W}_w{w0}.npy")
+        mm = np.lib.format.open_memmap(path, mode="w+", dtype=dt, shape=(H * W,))
+        _fill_gather(mm, H, W, w0); mm.flush(); del mm
+        idx = np.load(path, mmap_mode="r")
+    else:
+        idx = np.empty(H * W, dtype=dt)
+        _fill_gather(idx, H, W, w0)
+        idx.setflags(write=False)
+    _perm_cache[key] = idx
+    if len(_perm_cache) > PERM_CACHE_SIZE: _perm_release(_perm_cache.popitem(last=False)[1])
+    return idx
+
+def perm_cache_info():
+    return dict(_perm_stats, size=len(_perm_cache), maxsize=PERM_CACHE_SIZE)
+
+def perm_cache_clear():
+    for idx in _perm_cache.values(): _perm_release(idx)
+    _perm_cache.clear(); _perm_stats.update(hits=0, misses=0)
+
+
+# ---- 流式转换：按分形列（W1 slab）分块读写 memmap，峰值内存 ~ chunk_bytes ----
+CHUNK_BYTES = 64 << 20
+
+def _slab_plan(H, W, h0, w0, itemsize, chunk_bytes):
+    """返回 (每块的分形列数, 每块的分形行数)：一列放不下时再按 h0 的整数倍切行"""
+    H1 = math.ceil(H / h0)
+    col_bytes = H1 * h0 * w0 * itemsize
+    if col_bytes <= chunk_bytes:
+        return max(1, chunk_bytes // col_bytes), H1
+    return 1, max(1, chunk_bytes // (h0 * w0 * itemsize))
+
+def nd_to_nz_stream(src, dst, h0, w0, chunk_bytes=CHUNK_BYTES, pad_val=0):
+    """src: (H, W) 数组/memmap；dst: (W1, H1, h0, w0) 数组/memmap。逐块写入，不整体载入内存"""
+    H, W = src.shape
+    W1, H1 = dst.shape[:2]
+    cols, rows = _slab_plan(H, W, h0, w0, dst.dtype.itemsize, chunk_bytes)
+    for c in range(0, W1, cols):
+        k = min(cols, W1 - c)
+        for r in range(0, H1, rows):
+            m = min(rows, H1 - r)
+            r0, r1 = r * h0, min((r + m) * h0, H)
+            c0, c1 = c * w0, min((c + k) * w0, W)
+            blk = np.full((m * h0, k * w0), pad_val, dtype=dst.dtype)
+            blk[:r1 - r0, :c1 - c0] = src[r0:r1, c0:c1]
+            dst[c:c + k, r:r + m] = blk.reshape(m, h0, k, w0).transpose(2, 0, 1, 3)
+    if hasattr(dst, "flush"): dst.flush()
+    return dst
+
+def nz_to_nd_stream(src, dst, h0, w0, chunk_bytes=CHUNK_BYTES):
+    """src: (W1, H1, h0, w0)；dst: (H, W)。逆向同样按分形列分块"""
+    H, W = dst.shape
+    W1, H1 = src.shape[:2]
+    cols, rows = _slab_plan(H, W, h0, w0, src.dtype.itemsize, chunk_bytes)
+    for c in range(0, W1, cols):
+        k = min(cols, W1 - c)
+        for r in range(0, H1, rows):
+            m = min(rows, H1 - r)
+            r0, r1 = r * h0, min((r + m) * h0, H)
+            c0, c1 = c * w0, min((c + k) * w0, W)
+            blk = np.asarray(src[c:c + k, r:r + m]).transpose(1, 2, 0, 3).reshape(m * h0, k * w0)
+            dst[r0:r1, c0:c1] = blk[:r1 - r0, :c1 - c0]
+    if hasattr(dst, "flush"): dst.flush()
+    return dst
+
+def open_array(path, shape=None, dtype=None, mode="r"):
+    """.npy 用 NumPy 头信息（mode="w+" 时新建），其余按裸二进制 memmap（需给 shape/dtype）"""
+    if path.endswith(".npy"):
+        if mode == "w+":
+            return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=tuple(shape))
+        return np.load(path, mmap_mode=mode)
+    return np.memmap(path, dtype=dtype, mode=mode, shape=tuple(shape))
+
+def nz_shape(H, W, h0, w0):
+    return math.ceil(W / w0), math.ceil(H / h0), h0, w0
+
+def nd_to_nz_file(src_path, dst_path, h0, w0, shape=None, dtype=None, chunk_bytes=CHUNK_BYTES, pad_val=0):
+    """ND 文件 -> NZ 文件（.npy 或裸二进制）；裸二进制输入需给 (H, W) 与 dtype"""
+    src = open_array(src_path, shape, dtype, "r")
+    dst = open_array(dst_path, nz_shape(*src.shape, h0, w0), src.dtype, "w+")
+    nd_to_nz_stream(src, dst, h0, w0, chunk_bytes, pad_val)
+    return dst.shape
+
+def nz_to_nd_file(src_path, dst_path, H, W, h0, w0, dtype=None, chunk_bytes=CHUNK_BYTES):
+    """NZ 文件 -> ND 文件；(H, W) 为逻辑形状（NZ 里不含 padding 信息）"""
+    src = open_array(src_path, nz_shape(H, W, h0, w0), dtype, "r")
+    dst = open_array(dst_path, (H, W), src.dtype, "w+")
+    nz_to_nd_stream(src, dst, h0, w0, chunk_bytes)
+    return dst.shape
+
+
+# ---------------- 命令行：批量 ND <-> NZ 转换（无需 Qt） ---------------- #
+# NZ 文件的物理形状为 (W1, H1, h0, w0)；CSV 只能存二维，NZ 写成 (W1·H1·h0, w0)（即连续缓冲按 w0 折行）。
+IO_FORMATS = ("npy", "raw", "csv")
+_EXT = {"npy": ".npy", "raw": ".bin", "csv": ".csv"}
+
+def io_format(path, fmt=None):
+    if fmt: return fmt
+    return {".npy": "npy", ".csv": "csv"}.get(os.path.splitext(path)[1].lower(), "raw")
+
+def read_array(path, fmt, dtype, shape=None):
+    """npy / raw 以只读 memmap 打开，csv 读入内存；给出 shape 时 reshape 成该形状（raw 必须给）"""
+    if fmt == "csv":
+        a = np.loadtxt(path, delimiter=",", dtype=dtype, ndmin=2)
+    elif fmt == "npy":
+        a = np.load(path, mmap_mode="r")
+    else:
+        if shape is None:
+            raise ValueError(f"{path}: raw input needs --shape")
+        a = np.memmap(path, dtype=dtype, mode="r", shape=(math.prod(shape),))
+    return a if shape is None else a.reshape(shape)
+
+def create_array(path, fmt, shape, dtype):
+    """npy / raw 直接建输出 memmap；csv 先在内存里转换，最后由 write_csv 整体写出"""
+    if fmt == "npy": return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=tuple(shape))
+    if fmt == "raw": return np.memmap(path, dtype=dtype, mode="w+", shape=tuple(shape))
+    return np.empty(shape, dtype=dtype)
+
+def write_csv(path, arr):
+    arr = arr.reshape(-1, arr.shape[-1])
+    if np.issubdtype(arr.dtype, np.integer): fmt = "%d"
+    else: fmt = {2: "%.5g", 4: "%.9g"}.get(arr.dtype.itemsize, "%.17g")     # 足以无损往返
+    np.savetxt(path, arr, fmt=fmt, delimiter=",")
+
+def output_path(src_path, to, fmt, out_dir=None):
+    """a/x.npy -> <out_dir 或 a>/x.nz.npy；输入名已带 .nd / .nz 后缀时先去掉"""
+    stem = os.path.splitext(os.path.basename(src_path))[0]
+    if stem.endswith((".nd", ".nz")): stem = stem[:-3]
+    return os.path.join(out_dir or os.path.dirname(src_path), f"{stem}.{to}{_EXT[fmt]}")
+
+def same_file(a, b):
+    """两个路径是否指向同一文件（都存在时按 inode 判断，可识别链接与不同写法）"""
+    if os.path.exists(a) and os.path.exists(b): return os.path.samefile(a, b)
+    return os.path.normcase(os.path.abspath(a)) == os.path.normcase(os.path.abspath(b))
+
+def already_converted(path, to):
+    """文件名已带目标格式后缀（x.nz.npy 之于 --to nz）：视为上一次的输出，跳过"""
+    return os.path.splitext(os.path.basename(path))[0].endswith(f".{to}")
+
+def convert_file(src_path, dst_path, to="nz", h0=16, w0=16, shape=None, dtype="float32",
+                 in_fmt=None, out_fmt=None, chunk_bytes=CHUNK_BYTES, pad_val=0):
+    """
+    单个文件转换，返回 {src, dst, shape, bytes, seconds}；bytes 为逻辑张量 H·W·itemsize。
+    to="nz"：输入为 ND（npy / csv 自带形状，raw 需 shape=(H, W)）；to="nd"：输入为 NZ，shape 为逻辑 (H, W)。
+    dtype 只对 raw / csv 输入生效，npy 以文件头为准；输出 dtype 与输入相同。
+    """
+    t0 = time.perf_counter()
+    if same_file(src_path, dst_path):      # 输出以 w+ 打开会先把仍在 memmap 的输入截断清零
+        raise ValueError(f"{src_path}: output path is the input file itself")
+    in_fmt, out_fmt = io_format(src_path, in_fmt), io_format(dst_path, out_fmt)
+    if to == "nz":
+        src = read_array(src_path, in_fmt, dtype, shape if in_fmt == "raw" else None)   # npy / csv 自带形状
+        if src.ndim != 2:
+            raise ValueError(f"{src_path}: expected a 2-D ND matrix, got shape {src.shape}")
+        H, W = src.shape
+        dst = create_array(dst_path, out_fmt, nz_shape(H, W, h0, w0), src.dtype)
+        nd_to_nz_stream(src, dst, h0, w0, chunk_bytes, pad_val)
+    elif to == "nd":
+        if shape is None:
+            raise ValueError(f"{src_path}: NZ -> ND needs the logical shape (--shape H W)")
+        H, W = shape
+        src = read_array(src_path, in_fmt, dtype, nz_shape(H, W, h0, w0))
+        dst = create_array(dst_path, out_fmt, (H, W), src.dtype)
+        nz_to_nd_stream(src, dst, h0, w0, chunk_bytes)
+    else:
+        raise ValueError(f"unknown target {to!r}, expected 'nz' or 'nd'")
+    if out_fmt == "csv": write_csv(dst_path, dst)
+    del dst                                                   # 关闭 memmap，落盘
+    return {"src": src_path, "dst": dst_path, "shape": (H, W), "bytes": H * W * src.dtype.itemsize,
+            "seconds": time.perf_counter() - t0}
+
+def _check_outputs(jobs):
+    key = lambda p: os.path.normcase(os.path.realpath(p))
+    owner, clashes = {}, []
+    for job in jobs:
+        k = key(job["dst_path"])
+        if k in owner: clashes.append(f"{owner[k]} and {job['src_path']} -> {job['dst_path']}")
+        owner.setdefault(k, job["src_path"])
+    srcs = {key(job["src_path"]): job["src_path"] for job in jobs}
+    clashes += [f"{owner[k]} -> {srcs[k]} overwrites an input" for k in owner if k in srcs]
+    if clashes:
+        raise ValueError("conflicting output paths: " + "; ".join(clashes))
+
+def batch_convert(jobs, workers=None, report=None):
+    """
+    jobs：每项为 convert_file 的关键字参数 dict；文件之间互相独立，分发到进程池。
+    workers=None 用 CPU 核数，0 在当前进程里顺序执行；report(result) 每完成一个文件回调一次。
+    返回 (results, wall_seconds)，results 与 jobs 同序；失败的文件 result 里带 error。
+    提交前检查输出路径：两个任务写同一文件、或某任务的输出是另一任务的输入时直接报 ValueError。
+    """
+    jobs = list(jobs)
+    _check_outputs(jobs)
+    results = [None] * len(jobs)
+    t0 = time.perf_counter()
+
+    def finish(i, fn):
+        try:
+            results[i] = fn()
+        except Exception as e:
+            results[i] = {"src": jobs[i]["src_path"], "error": f"{type(e).__name__}: {e}"}
+        if report: report(results[i])
+
+    if workers == 0 or len(jobs) <= 1:
+        for i, job in enumerate(jobs): finish(i, lambda: convert_file(**job))
+    else:
+        with ProcessPoolExecutor(max_workers=min(len(jobs), workers or os.cpu_count() or 1)) as pool:
+            futs = [pool.submit(convert_file, **job) for job in jobs]
+            for i, f in enumerate(futs): finish(i, f.result)
+    return results, time.perf_counter() - t0
+
+def _report_line(r):
+    if "error" in r:
+        return f"FAILED {r['src']}: {r['error']}"
+    gbps = r["bytes"] / r["seconds"] / 1e9 if r["seconds"] else float("inf")
+    return (f"{r['src']} -> {r['dst']}  {r['shape'][0]}x{r['shape'][1]}  "
+            f"{r['bytes'] / 1e6:.1f} MB in {r['seconds']:.3f}s  ({gbps:.2f} GB/s)")
+
+def cli(argv=None):
+    ap = argparse.ArgumentParser(prog="nz_convert.py", description="批量 ND <-> NZ 转换")
+    ap.add_argument("inputs", nargs="+", help="输入文件（.npy / .csv / 其余按裸二进制）")
+    ap.add_argument("--to", choices=("nz", "nd"), default="nz", help="目标格式（默认 nz）")
+    ap.add_argument("--h0", type=int, default=16)
+    ap.add_argument("--w0", type=int, default=16)
+    ap.add_argument("--shape", type=int, nargs=2, metavar=("H", "W"),
+                    help="逻辑形状：raw 输入与 NZ -> ND 必须给出")
+    ap.add_argument("--dtype", default="float32", help="raw / csv 输入的元素类型（默认 float32）")
+    ap.add_argument("--in-format", choices=IO_FORMATS, help="默认按扩展名判断")
+    ap.add_argument("--out-format", choices=IO_FORMATS, help="默认与输入相同")
+    ap.add_argument("-o", "--out-dir", help="输出目录（默认与输入同目录）")
+    ap.add_argument("-j", "--workers", type=int, help="进程数（默认 CPU 核数，0 = 当前进程顺序执行）")
+    ap.add_argument("--chunk-mb", type=float, default=CHUNK_BYTES / 2**20, help="每个进程一次读写的块大小")
+    ap.add_argument("--pad-val", type=float, default=0, help="NZ padding 填充值")
+    args = ap.parse_args(argv)
+
+    if args.out_dir: os.makedirs(args.out_dir, exist_ok=True)
+    jobs = []
+    for path in args.inputs:
+        if already_converted(path, args.to):
+            print(f"skip {path}: already .{args.to}", flush=True); continue
+        in_fmt = io_format(path, args.in_format)
+        out_fmt = args.out_format or in_fmt
+        jobs.append(dict(src_path=path, dst_path=output_path(path, args.to, out_fmt, args.out_dir), to=args.to,
+                         h0=args.h0, w0=args.w0, shape=args.shape, dtype=args.dtype, in_fmt=in_fmt,
+                         out_fmt=out_fmt, chunk_bytes=int(args.chunk_mb * 2**20), pad_val=args.pad_val))
+    try:
+        results, wall = batch_convert(jobs, args.workers, report=lambda r: print(_report_line(r), flush=True))
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    ok = [r for r in results if "error" not in r]
+    total = sum(r["bytes"] for r in ok)
+    print(f"{len(ok)}/{len(results)} files, {total / 1e9:.3f} GB in {wall:.3f}s "
+          f"({total / wall / 1e9 if wall else 0.0:.2f} GB/s aggregate)")
+    return 0 if len(ok) == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -1,12 +1,17 @@
 # -*- coding: utf-8 -*-
-import sys, math, csv
+import sys, os, math, csv
 import numpy as np
 from PyQt5 import QtWidgets, QtCore, QtGui
+# 流式转换、命令行批量转换与 NZ gather 下标缓存在 nz_convert（无需 Qt），这里一并导出
+from nz_convert import (CHUNK_BYTES, nd_to_nz_stream, nz_to_nd_stream, open_array, nz_shape,  # noqa: F401
+                        nd_to_nz_file, nz_to_nd_file, cli,
+                        nz_gather_index, perm_cache_info, perm_cache_clear)
 
 
 # ---------------- 逻辑层：ND/NZ 辅助函数 ---------------- #
 
 def pad_to_tiles(arr, h0, w0, pad_val=np.nan):
+    """pad 到 h0×w0 的整数倍；默认用 NaN 标出 padding（界面展示用，结果为 float）"""
     H, W = arr.shape
     H1 = math.ceil(H / h0)
     W1 = math.ceil(W / w0)
@@ -15,52 +20,58 @@ def pad_to_tiles(arr, h0, w0, pad_val=np.nan):
     out[:H, :W] = arr
     return out, (H1, W1, Hp, Wp)
 
+def pad_nd(arr, h0, w0, pad_val=0):
+    """pad 到 h0×w0 的整数倍，保持 dtype（整数类型不会被转成 float）"""
+    H, W = arr.shape
+    Hp, Wp = math.ceil(H / h0) * h0, math.ceil(W / w0) * w0
+    if (Hp, Wp) == (H, W):
+        return arr
+    out = np.full((Hp, Wp), pad_val, dtype=arr.dtype)
+    out[:H, :W] = arr
+    return out
+
 def nd_flatten(arr):
     """Row-major flatten ignoring NaN（跳过 padding）"""
-    vals = arr.flatten(order="C")
-    return [int(v) if not np.isnan(v) else None for v in vals if not np.isnan(v)]
+    vals = np.asarray(arr).ravel(order="C")
+    return vals[~np.isnan(vals)] if vals.dtype.kind == "f" else vals
 
 def nz_order_indices(Hp, Wp, h0, w0):
-    """按『列优先的分形块顺序 + 块内行优先』生成线性索引（行主序索引）"""
-    H1, W1 = Hp // h0, Wp // w0
-    order = []
-    for tile_c in range(W1):          # 列优先（外层）
-        for tile_r in range(H1):
-            base_r = tile_r * h0
-            base_c = tile_c * w0
-            for i in range(h0):       # 块内行优先（内层）
-                for j in range(w0):
-                    r = base_r + i
-                    c = base_c + j
-                    order.append(r * Wp + c)
-    return order
+    """按『列优先的分形块顺序 + 块内行优先』生成线性索引（行主序索引）；结果来自缓存，只读"""
+    return nz_gather_index(Hp, Wp, h0, w0)
+
+def nd_to_nz(arr, h0, w0, pad_val=0):
+    """ND (H, W) → NZ 物理布局 (W1, H1, h0, w0)：pad 后 (H1,h0,W1,w0) 视图转置，padding 填 pad_val"""
+    padded = pad_nd(np.asarray(arr), h0, w0, pad_val)
+    Hp, Wp = padded.shape
+    return np.ascontiguousarray(padded.reshape(Hp // h0, h0, Wp // w0, w0).transpose(2, 0, 1, 3))
+
+def nz_to_nd(nz, H, W):
+    """NZ (W1, H1, h0, w0) → ND (H, W)，裁掉 padding"""
+    W1, H1, h0, w0 = nz.shape
+    return np.ascontiguousarray(nz.transpose(1, 2, 0, 3).reshape(H1 * h0, W1 * w0)[:H, :W])
+
+def nz_mask(H, W, h0, w0):
+    """NZ 布局下的有效元素掩码 (W1, H1, h0, w0)：True = 原矩阵元素，False = padding"""
+    H1, W1 = math.ceil(H / h0), math.ceil(W / w0)
+    rows = (np.arange(H1 * h0) < H).reshape(H1, h0)
+    cols = (np.arange(W1 * w0) < W).reshape(W1, w0)
+    return rows[None, :, :, None] & cols[:, None, None, :]
 
 def nd_to_nz_flat(arr, h0, w0, pad_val=np.nan):
-    """返回 NZ 线性序列（跳过 padding）"""
-    padded, (H1, W1, Hp, Wp) = pad_to_tiles(arr, h0, w0, pad_val=pad_val)
-    order = nz_order_indices(Hp, Wp, h0, w0)
-    nz_seq = []
-    for idx in order:
-        v = padded.flat[idx]
-        if not np.isnan(v):
-            nz_seq.append(int(v))
-    return padded, (H1, W1, Hp, Wp), nz_seq
+    """返回 NZ 线性序列（跳过 padding），与 arr 同 dtype"""
+    padded, meta = pad_to_tiles(arr, h0, w0, pad_val=pad_val)
+    H, W = np.shape(arr)
+    nz_seq = np.asarray(arr).ravel()[nz_gather_index(H, W, h0, w0)]
+    return padded, meta, nz_seq
 
 def nz_to_nd_from_flat(nz_seq, H, W, h0, w0):
-    """给定 NZ 序列，复原成 H×W 的 ND 布局（丢弃 padding）"""
-    Hp = math.ceil(H / h0) * h0
-    Wp = math.ceil(W / w0) * w0
-    order = nz_order_indices(Hp, Wp, h0, w0)
-    padded = np.full((Hp, Wp), np.nan, dtype=float)
-    k = 0
-    for idx in order:
-        if k >= len(nz_seq):
-            break
-        r, c = divmod(idx, Wp)
-        if r < H and c < W:
-            padded[r, c] = nz_seq[k]
-        k += 1
-    return padded[:H, :W]
+    """给定 NZ 序列（不含 padding），复原成 H×W 的 ND 布局；序列不足时缺的位置为 NaN（整数类型为 0）"""
+    nz_seq = np.asarray(nz_seq)
+    dtype = nz_seq.dtype if nz_seq.size else np.dtype(float)
+    n = min(len(nz_seq), H * W)
+    out = np.empty(H * W, dtype=dtype) if n == H * W else np.full(H * W, np.nan if dtype.kind == "f" else 0, dtype=dtype)
+    out[nz_gather_index(H, W, h0, w0)[:n]] = nz_seq[:n]
+    return out.reshape(H, W)
 
 
 # ---------------- UI 层：表格与绘制代理 ---------------- #
@@ -212,6 +223,7 @@ class NZDemo(QtWidgets.QWidget):
         self.base = None              # 原始 H×W
         self.padded = None            # pad 后 Hp×Wp
         self.nz_seq = None
+        self.nd_seq = None
         self.update_base_incremental()
 
         # 信号
@@ -261,6 +273,7 @@ class NZDemo(QtWidgets.QWidget):
     def reset_steps(self):
         self.step = 0
         self.padded, _, self.nz_seq = nd_to_nz_flat(self.base, self.h0_spin.value(), self.w0_spin.value())
+        self.nd_seq = nd_flatten(self.base)
         self.render()
 
     def prev_step(self):
@@ -307,11 +320,9 @@ class NZDemo(QtWidgets.QWidget):
         arr = self.get_matrix_for_current_step()
         self.table.set_matrix(arr)
 
-        # 文本框：ND/NZ 序列
-        nd_seq = nd_flatten(self.base)
-        self.seq_nd.setPlainText(str(nd_seq))
-        _, _, nz_seq = nd_to_nz_flat(self.base, self.h0_spin.value(), self.w0_spin.value())
-        self.seq_nz.setPlainText(str(nz_seq))
+        # 文本框：ND/NZ 序列（reset_steps 里已算好）
+        self.seq_nd.setPlainText(str(self.nd_seq.astype(np.int64).tolist()))
+        self.seq_nz.setPlainText(str(self.nz_seq.astype(np.int64).tolist()))
 
         # 在“步骤2/分块示意”时画 tile 边界；其他步骤关闭
         mode = self.mode_combo.currentIndex()
@@ -333,11 +344,15 @@ class NZDemo(QtWidgets.QWidget):
 
 # ---------------- 入口 ---------------- #
 
-def main():
+def main(argv=None):
+    """带参数：命令行批量转换（同 nz_convert.py）；不带参数：打开 GUI。返回进程退出码"""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        return cli(argv)
     app = QtWidgets.QApplication(sys.argv)
     w = NZDemo()
     w.show()
-    sys.exit(app.exec_())
+    return app.exec_()
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1,17 +1,25 @@
 # panels.py
+import time
+
 try:
-    from PyQt5.QtCore import Qt
+    from PyQt5.QtCore import Qt, QTimer
     from PyQt5.QtWidgets import (
-        QWidget, QMainWindow, QGridLayout, QVBoxLayout, QHBoxLayout, QLabel, QDialog
+        QWidget, QMainWindow, QGridLayout, QVBoxLayout, QHBoxLayout, QLabel, QDialog,
+        QCheckBox, QPushButton, QFileDialog, QSlider
     )
 except Exception:
-    from PyQt6.QtCore import Qt
+    from PyQt6.QtCore import Qt, QTimer
     from PyQt6.QtWidgets import (
-        QWidget, QMainWindow, QGridLayout, QVBoxLayout, QHBoxLayout, QLabel, QDialog
+        QWidget, QMainWindow, QGridLayout, QVBoxLayout, QHBoxLayout, QLabel, QDialog,
+        QCheckBox, QPushButton, QFileDialog, QSlider
     )
 
 from widgets import ClickableCard, ControlBar, LogPane, Ticker, QueueBar, BandwidthBar
-from sim import Simulator, scenario_gemm, scenario_conv_im2col, scenario_vector_only, scenario_mte_only
+from sim import Simulator, scenario_program
+from worker import SimWorker
+from tuner import Tuner
+from costcache import theory
+from simtrace import TraceWriter, TraceReader, TraceReplayer, export_chrome
 from details import MteDetailDialog, CubeDetailDialog, VectorDetailDialog
 
 
@@ -45,7 +53,27 @@ class AscendTopWindow(QMainWindow):
         self.ctrl = ControlBar()
         self.log  = LogPane()
         grid.addWidget(self.ctrl, 0,0,1,2)
-        grid.addWidget(self.log, 4,0,1,2)
+        logbox = QWidget(); grid.addWidget(logbox, 4,0,1,2)
+        lv = QVBoxLayout(logbox); lv.setContentsMargins(0,0,0,0); lv.setSpacing(4)
+        lh = QHBoxLayout(); lv.addLayout(lh); lv.addWidget(self.log)
+        self.chkLevels = {}
+        for lvl in LogPane.LEVELS:
+            cb = QCheckBox(lvl); cb.setChecked(True); cb.toggled.connect(self.on_log_levels)
+            self.chkLevels[lvl] = cb; lh.addWidget(cb)
+        self.btnSpill = QPushButton("Trace → File…"); self.btnSpill.setCheckable(True)
+        self.btnSpill.toggled.connect(self.on_log_spill)
+        # trace 录制 / 回放拖动
+        self.btnRecord = QPushButton("Record Trace"); self.btnRecord.setCheckable(True)
+        self.btnRecord.toggled.connect(self.on_record)
+        self.btnReplay = QPushButton("Replay Trace…"); self.btnReplay.clicked.connect(self.on_replay)
+        self.btnBack = QPushButton("◀ Back"); self.btnBack.setEnabled(False)
+        self.btnBack.clicked.connect(self.on_step_back)
+        self.scrub = QSlider(Qt.Orientation.Horizontal); self.scrub.setEnabled(False)
+        self.scrub.sliderMoved.connect(self.on_scrub)
+        self.btnTimeline = QPushButton("Export Timeline…"); self.btnTimeline.clicked.connect(self.on_export_timeline)
+        for b in (self.btnRecord, self.btnReplay, self.btnBack, self.btnTimeline): lh.addWidget(b)
+        lh.addWidget(self.scrub, 1)
+        lh.addStretch(1); lh.addWidget(self.btnSpill)
 
         # ====== 数据路径（上排） ======
         data = QWidget(); grid.addWidget(data, 1,0,1,2)
@@ -128,14 +156,24 @@ class AscendTopWindow(QMainWindow):
 
         # ---- 仿真器 ----
         self.sim = Simulator()
+        self._live = self.sim     # 回放时 self.sim 临时换成 TraceReplayer
         self.ticker = Ticker(interval_ms=self.ctrl.speed.value())
-        self.ctrl.speedChanged.connect(self.ticker.set_interval)
+        self.ctrl.speedChanged.connect(self.on_speed)
+        self.ctrl.cyclesPerFrameChanged.connect(self.on_speed)
+        self.ctrl.workerToggled.connect(self.on_worker)
+        self.worker = None        # 后台进程模式：仿真不在 GUI 线程里跑
+        self._snap_done = False
+        # 批量推进时的聚合状态：界面按固定帧率（30 Hz）采样，中间事件只计数
+        self._agg = None
+        self._batch_left = 0      # 上一批因时间预算未跑完的拍数
+        self._frame = QTimer(self); self._frame.timeout.connect(self.render_frame); self._frame.start(33)
         self.ctrl.start.connect(self.start)
         self.ctrl.pause.connect(self.pause)
         self.ctrl.step.connect(self.step_once)
         self.ctrl.reset.connect(self.reset)
         self.ctrl.scenarioChanged.connect(self.on_scenario)
-        self.ctrl.paramsApplied.connect(self.apply_params)
+        self.ctrl.paramsApplied.connect(self.reset)     # GEMM 程序依赖 M,N,K/Tm,Tn,Tk，应用参数即重建
+        self.ctrl.autoTuneRequested.connect(self.on_autotune)
 
         # 映射（控制/数据分别高亮）
         self.ctrl_map = {
@@ -149,8 +187,13 @@ class AscendTopWindow(QMainWindow):
             "Cube@k": self.cube, "Accumulate(L0C)": self.acc,
             "Vector(Read L0C)": self.l0c, "Vector(Act": self.vector,
             "Vector(ReLU)": self.vector, "Vector(Read L1)": self.l1,
-            "Vector(Scale+Bias)": self.vector, "Write C(L1)": self.l1, "Write L1": self.l1
+            "Vector(Scale+Bias)": self.vector, "Write C(L1)": self.l1, "Write L1": self.l1,
+            "MTE(reuse": self.mte, "Spill C(": self.l0c, "Reload C(": self.l0c
         }
+        self.bw_bars = {"L1->L0A": self.bw_a, "L1->L0B": self.bw_b, "L0C->L1": self.bw_c}
+        self._ctrl_cards = {}     # 阶段名 → 卡片（惰性填充）
+        self._data_cards = {}
+        self._active = None       # 当前高亮 (card, tint)
 
         self.reset()
 
@@ -179,62 +222,269 @@ class AscendTopWindow(QMainWindow):
 
     # ==== 控制 ====
     def apply_params(self):
-        # 从控件写回仿真器参数，并刷新上限
-        s = self.sim; c = self.ctrl
+        # 从控件写回仿真器参数，并刷新上限（回放时 self.sim 是 TraceReplayer，参数写到实时仿真器上）
+        s = self._live; c = self.ctrl
         s.M, s.N, s.K = c.spM.value(), c.spN.value(), c.spK.value()
         s.Tm, s.Tn, s.Tk = c.spTm.value(), c.spTn.value(), c.spTk.value()
         s.bits, s.Wv = c.spBits.value(), c.spWv.value()
         s.gamma_out, s.gamma_in = c.spGo.value(), c.spGi.value()
         s.vmax_L1A, s.vmax_L1B, s.vmax_CW = c.spBW_A.value(), c.spBW_B.value(), c.spBW_C.value()
+        s.buf_depth = c.spDepth.value()
 
         self.bw_a.set_max(s.vmax_L1A); self.bw_b.set_max(s.vmax_L1B); self.bw_c.set_max(s.vmax_CW)
 
         # 更新建议与理论拍数
-        wv_need = s.suggest_Wv()
-        cube_cyc = s.cube_cycles_theory()
-        vec_cyc  = s.vector_cycles_theory()
+        th = theory(**s.params())          # 同一组参数只算一次（costcache.default_cache）
+        wv_need, cube_cyc, vec_cyc = th["suggest_Wv"], th["cube_cycles"], th["vector_cycles"]
         self.lblWvSg.setText(f"Suggested Wv ≥ {wv_need:.1f}   (now {s.Wv})")
         self.lblTheo.setText(f"Cycles (Cube/Vector): {cube_cyc} / {vec_cyc}")
-        self.log.log(f"[PARAM] Set M,N,K={s.M},{s.N},{s.K}; Tile={s.Tm}×{s.Tn}×{s.Tk}; bits={s.bits}; Wv={s.Wv}; γ_out={s.gamma_out}, γ_in={s.gamma_in}; BW_A/B/C={s.vmax_L1A}/{s.vmax_L1B}/{s.vmax_CW} bits/cycle.")
+        try:
+            sl = s.l0_slots()
+            for card, buf, cap in ((self.l0a, "L0A", s.l0a_bytes), (self.l0b, "L0B", s.l0b_bytes),
+                                   (self.l0c, "L0C", s.l0c_bytes)):
+                card.set_badge(f"{cap / 1024:g} KB · {sl[buf]} slot(s)")
+        except ValueError as e:
+            self.log.log(f"[PARAM] {e}")
+        self.log.log(f"[PARAM] Set M,N,K={s.M},{s.N},{s.K}; Tile={s.Tm}×{s.Tn}×{s.Tk}; bits={s.bits}; Wv={s.Wv}; γ_out={s.gamma_out}, γ_in={s.gamma_in}; BW_A/B/C={s.vmax_L1A}/{s.vmax_L1B}/{s.vmax_CW} bits/cycle; L0 depth={s.buf_depth}.")
+
+    def on_autotune(self):
+        """解析模型搜索 Tm/Tn/Tk/循环顺序/Wv，取 Pareto 前沿上拍数最少的点填回控件并重建程序"""
+        c = self.ctrl
+        self.pause()
+        self.apply_params()
+        params = {k: v for k, v in self._live.params().items() if k not in ("M", "N", "K", "Tm", "Tn", "Tk", "Wv")}
+        tiles = tuple(s for s in (16, 32, 64, 128) if s <= c.spTm.maximum())
+        t = Tuner(c.spM.value(), c.spN.value(), c.spK.value(), sizes=tiles, **params)
+        front = t.run()
+        if not front:
+            self.log.log("[PARAM] Auto-tune: no tile fits the L0 capacities."); return
+        best = front[0]
+        c.spTm.setValue(best["Tm"]); c.spTn.setValue(best["Tn"]); c.spTk.setValue(best["Tk"])
+        c.spWv.setValue(best["Wv"]); c.cbxOrder.setCurrentText(best["order"])
+        self.reset()                # 会清空日志，前沿在重建之后再打印
+        for r in front:
+            self.log.log(f"[PARAM] Pareto: {r['Tm']}×{r['Tn']}×{r['Tk']} {r['order']} Wv={r['Wv']} → "
+                         f"{r['cycles']} cycles, {r['traffic']} L1 bits (bound: {r['bound']})")
+        self.log.log(f"[PARAM] Auto-tune: {t.evaluated} evaluated, {t.pruned} pruned, {t.infeasible} over L0 capacity.")
 
     def on_scenario(self, text): self.reset(text)
 
+    def on_log_levels(self):
+        self.log.set_levels(l for l, cb in self.chkLevels.items() if cb.isChecked())
+
+    def on_log_spill(self, on: bool):
+        if not on:
+            self.log.spill_to(None); self.log.log("Trace file closed."); return
+        path, _ = QFileDialog.getSaveFileName(self, "Trace log", "trace.log", "Log Files (*.log *.txt)")
+        if not path:
+            self.btnSpill.blockSignals(True); self.btnSpill.setChecked(False); self.btnSpill.blockSignals(False)
+            return
+        self.log.log(f"Trace → {path} (view paused).")
+        self.log.spill_to(path)
+
     def reset(self, scenario_text=None):
         text = scenario_text or self.ctrl.cbxScenario.currentText()
-        if "GEMM" in text:     prog = scenario_gemm(K_layers=6)
-        elif "Conv2D" in text: prog = scenario_conv_im2col(tiles=4)
-        elif "Vector-only" in text: prog = scenario_vector_only()
-        else:                  prog = scenario_mte_only()
-
+        self.log.clear()
+        self._batch_left = 0
+        self._stop_record()
+        if self.sim is not self._live:        # 退出回放
+            self.sim = self._live
+            self.scrub.setEnabled(False); self.btnBack.setEnabled(False)
+        self.apply_params()  # 用当前控件值初始化（GEMM 程序按当前参数生成）
+
+        prog = scenario_program(text, order=self.ctrl.cbxOrder.currentText(), **self.sim.params())
         self.sim.reset(prog)
+        if self.worker is not None:
+            self.worker.reset(text, self.sim.params(), self.ctrl.cbxOrder.currentText())
+            self._snap_done = False
         self.sim.on_visit_ctrl = self.on_visit_ctrl
         self.sim.on_visit_data = self.on_visit_data
         self.sim.on_done = self.on_done
 
         self.clear_active()
-        self.log.clear()
         self.log.log(f"Scenario ready: {text}. Set params then Start/Step.")
 
         self.bw_a.set_value(0); self.bw_b.set_value(0); self.bw_c.set_value(0)
         self.q_cube.set_value(0); self.q_vec.set_value(0); self.q_mte.set_value(0)
         self.lblMacV.setText("MACs: 0   VectorOps: 0")
-        self.apply_params()  # 用当前控件值初始化
+
+    def on_worker(self, on: bool):
+        self.pause()
+        if on:
+            self.worker = SimWorker(use_process=True)
+        elif self.worker is not None:
+            self.worker.close(); self.worker = None
+        self.reset()
+        self.log.log("Background simulation process " + ("enabled." if on else "disabled."))
+
+    def closeEvent(self, e):
+        if self.worker is not None: self.worker.close()
+        super().closeEvent(e)
 
     def start(self):
+        if self.worker is not None:
+            self.worker.start(); self.log.log("Simulation started (background)."); return
         if not self.ticker.running():
             self.ticker.tick.connect(self.on_tick)
             self.ticker.start()
             self.log.log("Simulation started.")
 
     def pause(self):
+        if self.worker is not None:
+            self.worker.pause(); return
         if self.ticker.running():
             self.ticker.stop()
             try: self.ticker.tick.disconnect(self.on_tick)
             except Exception: pass
             self.log.log("Paused.")
 
-    def step_once(self): self.on_tick()
-    def on_tick(self):   self.sim.step()
+    def on_speed(self, *_):
+        # “max” 模式下定时器空闲即触发，由每帧时间预算限速
+        self.ticker.set_interval(0 if self.ctrl.spCpf.value() == 0 else self.ctrl.speed.value())
+
+    def step_once(self):
+        if self.worker is not None: self.worker.step(1); return     # 与本地模式一致：Step 只推进一拍
+        self.sim.step()
+        self._sync_scrub()
+
+    def on_tick(self):
+        n = self.ctrl.spCpf.value()
+        if n == 1: self.sim.step()
+        else: self.run_batch(n)
+        self._sync_scrub()
+
+    # ==== trace 录制 / 回放 ====
+    def on_record(self, on: bool):
+        if not on:
+            self._stop_record(); return
+        if self.worker is not None:           # 后台进程模式下本地仿真器不推进，录下来是空的
+            self.log.log("Disable the background process to record a trace.")
+            path = None
+        else:
+            path, _ = QFileDialog.getSaveFileName(self, "Record trace", "run.astrace", "Ascend Trace (*.astrace)")
+        if not path or self.sim is not self._live:
+            self.btnRecord.blockSignals(True); self.btnRecord.setChecked(False); self.btnRecord.blockSignals(False)
+            return
+        self._live.trace = TraceWriter(path, self._live.params())
+        self.log.log(f"Recording trace → {path}")
+
+    def _stop_record(self):
+        if self._live.trace is not None:
+            self._live.trace.close(); self._live.trace = None
+            self.log.log("Trace recording closed.")
+        self.btnRecord.blockSignals(True); self.btnRecord.setChecked(False); self.btnRecord.blockSignals(False)
+
+    def on_replay(self):
+        if self.worker is not None:
+            self.log.log("Disable the background process to replay a trace."); return
+        path, _ = QFileDialog.getOpenFileName(self, "Replay trace", "", "Ascend Trace (*.astrace)")
+        if not path: return
+        try:
+            reader = TraceReader(path)
+        except (OSError, ValueError) as e:
+            self.log.log(f"Cannot open trace: {e}"); return
+        self.pause(); self._stop_record()
+        self.clear_active()
+        self.sim = TraceReplayer(reader)
+        self.sim.on_visit_ctrl = self.on_visit_ctrl
+        self.sim.on_visit_data = self.on_visit_data
+        self.sim.on_done = self.on_done
+        self.scrub.setRange(0, reader.last_cycle()); self.scrub.setValue(0)
+        self.scrub.setEnabled(True); self.btnBack.setEnabled(True)
+        self.log.log(f"Replaying {path}: {len(reader)} events, {reader.last_cycle() + 1} cycles. Reset to leave replay.")
+
+    def on_export_timeline(self):
+        """用事件调度器重跑当前场景，导出 Chrome trace-event JSON（chrome://tracing / Perfetto 打开）"""
+        path, _ = QFileDialog.getSaveFileName(self, "Export timeline", "timeline.json", "Trace Event JSON (*.json)")
+        if not path: return
+        params = self._live.params()
+        prog = scenario_program(self.ctrl.cbxScenario.currentText(), order=self.ctrl.cbxOrder.currentText(), **params)
+        try:
+            res = export_chrome(path, prog, **params)
+        except (ValueError, RuntimeError) as e:
+            self.log.log(f"Timeline export failed: {e}"); return
+        self.log.log(f"Timeline → {path}: {res['cycles']} cycles, {res['instrs']} instrs")
+
+    def on_scrub(self, cycle: int):
+        if isinstance(self.sim, TraceReplayer): self.sim.seek(cycle)
+
+    def on_step_back(self):
+        if isinstance(self.sim, TraceReplayer):
+            self.sim.step_back(); self._sync_scrub()
+
+    def _sync_scrub(self):
+        if isinstance(self.sim, TraceReplayer):
+            self.scrub.blockSignals(True); self.scrub.setValue(self.sim.cycles); self.scrub.blockSignals(False)
+
+    def run_batch(self, n: int, budget_s: float = 0.012):
+        """
+        一次推进 n 拍（n=0：在时间预算内尽可能多），回调只聚合，不直接刷界面。
+        n 拍在预算内跑不完时停下，剩余拍数记在 _batch_left，下一个 tick 先把它跑完（GUI 线程不被长批次卡住）。
+        """
+        s = self.sim
+        if n and self._batch_left: n = self._batch_left
+        if self._agg is None:
+            self._agg = {"ctrl": 0, "data": 0, "cycles0": s.cycles, "last_ctrl": None, "last_data": None, "bw": {}}
+        saved = (s.on_visit_ctrl, s.on_visit_data)
+        s.on_visit_ctrl, s.on_visit_data = self._agg_ctrl, self._agg_data
+        deadline = time.perf_counter() + budget_s
+        i = 0
+        try:
+            while not s.finished():
+                s.step(); i += 1
+                if n and i >= n: break
+                if (i & 255) == 0 and time.perf_counter() > deadline: break
+        finally:
+            s.on_visit_ctrl, s.on_visit_data = saved
+        self._batch_left = n - i if n and i < n and not s.finished() else 0
+        if s.finished():
+            self.render_frame(); self.on_done()
+
+    def _agg_ctrl(self, stage, name):
+        self._agg["ctrl"] += 1; self._agg["last_ctrl"] = (stage, name)
+
+    def _agg_data(self, stage, name, meta):
+        a = self._agg
+        a["data"] += 1; a["last_data"] = (stage, name, meta)
+        if meta["kind"]: a["bw"][meta["kind"]] = meta["bits_per_cycle"]
+
+    def render_frame(self):
+        if self.worker is not None:
+            snap = self.worker.poll()
+            if snap is not None: self.render_snapshot(snap)
+            return
+        a = self._agg
+        if a is None: return
+        self._agg = None
+        s = self.sim
+        if a["last_ctrl"]:
+            stage, name = a["last_ctrl"]
+            self._activate(self._resolve(stage, self.ctrl_map, self._ctrl_cards), "#5ac46d", stage)
+        if a["last_data"]:
+            stage, name, meta = a["last_data"]
+            self._activate(self._resolve(stage, self.data_map, self._data_cards), "#2a7fff", stage)
+        for kind, val in a["bw"].items(): self.bw_bars[kind].set_value(val)
+        self.q_cube.set_value(s.q_cube); self.q_vec.set_value(s.q_vec); self.q_mte.set_value(s.q_mte)
+        self.lblMacV.setText(f"MACs: {s.macs}   VectorOps: {s.vecops}")
+        last = f"{a['last_data'][1]} → {a['last_data'][0]}" if a["last_data"] else "-"
+        self.log.log(f"[DATA] cycles {a['cycles0']}→{s.cycles}: {a['ctrl']} ctrl / {a['data']} data events; last {last}")
+
+    def render_snapshot(self, snap):
+        if snap.last_ctrl:
+            stage, _ = snap.last_ctrl
+            self._activate(self._resolve(stage, self.ctrl_map, self._ctrl_cards), "#5ac46d", stage)
+        if snap.last_data:
+            stage, _ = snap.last_data
+            self._activate(self._resolve(stage, self.data_map, self._data_cards), "#2a7fff", stage)
+        for kind, val in snap.bw: self.bw_bars[kind].set_value(val)
+        self.q_cube.set_value(snap.q_cube); self.q_vec.set_value(snap.q_vec); self.q_mte.set_value(snap.q_mte)
+        self.lblMacV.setText(f"MACs: {snap.macs}   VectorOps: {snap.vecops}")
+        if snap.ctrl_events or snap.data_events:
+            last = f"{snap.last_data[1]} → {snap.last_data[0]}" if snap.last_data else "-"
+            self.log.log(f"[DATA] cycle {snap.cycles}: {snap.ctrl_events} ctrl / {snap.data_events} data events; last {last}")
+        if snap.done and not self._snap_done:
+            self.log.log("Program finished. (Event Sync)")
+        self._snap_done = snap.done
 
     def on_done(self):
         self.log.log("Program finished. (Event Sync)")
@@ -245,31 +495,38 @@ class AscendTopWindow(QMainWindow):
         for w in [self.l1,self.mte,self.l0a,self.l0b,self.cube,self.acc,self.l0c,self.vector,self.unified,
                   self.icache,self.dispatch,self.event,self.scalar]:
             w.set_active(False)
+        self._active = None
+
+    def _resolve(self, stage: str, mapping: dict, cache: dict):
+        # 阶段名 → 卡片：首次按子串匹配，之后查缓存
+        if stage not in cache:
+            cache[stage] = next((card for key, card in mapping.items() if key in stage), None)
+        return cache[stage]
+
+    def _activate(self, card, tint: str, stage: str):
+        # 只重绘上一张与新的高亮卡片
+        if self._active is not None and self._active != (card, tint):
+            self._active[0].set_active(False)
+            self._active = None
+        if card is None: return
+        if self._active is None:
+            card.set_active(True, tint=tint)
+            self._active = (card, tint)
+        card.set_badge(stage)
 
     def on_visit_ctrl(self, stage: str, name: str):
-        self.clear_active()
-        for key, card in self.ctrl_map.items():
-            if key in stage:
-                card.set_active(True, tint="#5ac46d")
-                card.set_badge(stage)
-                break
+        self._activate(self._resolve(stage, self.ctrl_map, self._ctrl_cards), "#5ac46d", stage)
         self.q_cube.set_value(self.sim.q_cube)
         self.q_vec.set_value(self.sim.q_vec)
         self.q_mte.set_value(self.sim.q_mte)
         self.log.log(f"[CTRL] {name} → {stage}")
 
     def on_visit_data(self, stage: str, name: str, meta):
-        self.clear_active()
-        for key, card in self.data_map.items():
-            if key in stage:
-                card.set_active(True, tint="#2a7fff")
-                card.set_badge(stage)
-                break
+        self._activate(self._resolve(stage, self.data_map, self._data_cards), "#2a7fff", stage)
         # 带宽条
         kind = meta.get("kind",""); val = meta.get("bits_per_cycle",0)
-        if "L1->L0A" in kind: self.bw_a.set_value(val)
-        if "L1->L0B" in kind: self.bw_b.set_value(val)
-        if "L0C->L1" in kind: self.bw_c.set_value(val)
+        bar = self.bw_bars.get(kind)
+        if bar is not None: bar.set_value(val)
 
         # 显示 MAC/VectorOps
         self.lblMacV.setText(f"MACs: {self.sim.macs}   VectorOps: {self.sim.vecops}")
@@ -0,0 +1,179 @@
+# roofline.py
+# Roofline 分析：以 Cube 峰值（Tm·Tn MAC/拍）为屋顶，L1→L0A / L1→L0B / L0C→L1 三条通路为斜坡，
+# 按 gen_gemm 的分块与 L0 复用规则求各级访存位数与算术强度（MAC/bit），找出限制资源，
+# 并可把一次仿真的实测点（cycles/macs/bits）放到图上看离上界还差多少。
+from typing import Dict, Optional, Tuple
+import math
+
+from sim import CONV_MODES, GEMM_ORDERS, PATHS, ConvShape, Simulator, gen_conv
+
+
+def gemm_traffic(M, N, K, Tm, Tn, Tk, order="MNK", bits=16, acc_bits=32) -> Dict[str, int]:
+    """
+    gen_gemm 各通路总搬运位数（闭式，与逐条累加 _transfer_bits 一致，含边界 tile）：
+    相邻两次迭代 A tile (m,k) / B tile (k,n) 不变则复用 L0、不再搬运。
+    """
+    if order not in GEMM_ORDERS:
+        raise ValueError(f"unknown loop order {order!r}, expected one of {GEMM_ORDERS}")
+    nm, nn, nk = math.ceil(M / Tm), math.ceil(N / Tn), math.ceil(K / Tk)
+    if order == "MNK":
+        a = M * K * (nn if nk > 1 else 1)
+        b = K * N * (nm if nk > 1 or nn > 1 else 1)
+    elif order == "NMK":
+        a = M * K * (nn if nk > 1 or nm > 1 else 1)
+        b = K * N * (nm if nk > 1 else 1)
+    else:   # KMN：A 在 n 循环内不变；B 每次 n 变化都重载
+        a = M * K
+        b = K * N * (nm if nn > 1 else 1)
+    c = M * N * bits
+    if order == "KMN":
+        c += 2 * (nk - 1) * M * N * acc_bits      # 非末层部分和 Spill + Reload（共用 L0C<->L1 端口）
+    return {"L1->L0A": a * bits, "L1->L0B": b * bits, "L0C->L1": c}
+
+
+def _tile_groups(n: int, t: int):
+    """一维分块：[(tile 尺寸, 个数)]，整块一组、余下的边界块一组"""
+    return [(sz, cnt) for sz, cnt in ((t, n // t), (n % t, 1)) if sz and cnt]
+
+
+def vector_min_cycles(s: Simulator) -> int:
+    """Vector 后处理下界：按每个输出 tile 的实际 tm×tn（含边界 tile）求 ceil(γ_out·tm·tn / Wv) 之和"""
+    return sum(cm * cn * math.ceil(s.gamma_out * tm * tn / max(1, s.Wv))
+               for tm, cm in _tile_groups(s.M, s.Tm) for tn, cn in _tile_groups(s.N, s.Tn))
+
+
+def conv_as_gemm(batch, C, H, W, K_out, R, S, stride=1, pad=0, dilation=1) -> Tuple[int, int, int]:
+    """im2col 展开后的 GEMM 形状：M = batch·Ho·Wo，N = K_out，K = C·R·S"""
+    return ConvShape(batch, C, H, W, K_out, R, S, stride, pad, dilation).gemm()
+
+
+def conv_traffic(shape: ConvShape, Tm, Tn, Tk, order="MNK", bits=16, acc_bits=32) -> Dict:
+    """
+    Conv2D 的字节账：
+      input_bytes / weight_bytes / output_bytes  原始张量大小
+      im2col_bytes     展开矩阵 M×K 的大小；duplicated_bytes = im2col_bytes - input_bytes（窗口重叠造成的重复）
+      blowup           im2col_bytes / input_bytes
+      im2col / implicit 两种方式各通路位数（im2col 另含物化时写 L1 的 M×K 位，走 L0C->L1 写端口）
+    """
+    M, N, K = shape.gemm()
+    input_bytes = shape.batch * shape.C * shape.H * shape.W * bits // 8
+    im2col_bytes = M * K * bits // 8
+    gemm = gemm_traffic(M, N, K, Tm, Tn, Tk, order, bits, acc_bits)
+    materialized = dict(gemm)
+    materialized["L0C->L1"] += M * K * bits
+    return {
+        "gemm": (M, N, K),
+        "input_bytes": input_bytes, "weight_bytes": N * K * bits // 8, "output_bytes": M * N * bits // 8,
+        "im2col_bytes": im2col_bytes, "duplicated_bytes": im2col_bytes - input_bytes,
+        "blowup": im2col_bytes / input_bytes if input_bytes else 0.0,
+        "bits": {"im2col": materialized, "implicit": gemm},
+    }
+
+
+def compare_conv(shape: ConvShape, order: str = "MNK", events: bool = True, q_depth: int = 8, **params) -> Dict:
+    """
+    im2col（物化）与 implicit GEMM 两种实现各跑一遍：返回 conv_traffic 的字节账，
+    以及每种方式的 cycles / bits / 拍数下界与限制资源（im2col 的下界含物化写回 materialize_cycles），
+    和 im2col 相对 implicit 的额外拍数比例 im2col_overhead。
+    """
+    from scheduler import EventScheduler
+    M, N, K = shape.gemm()
+    s = Simulator(**dict(params, M=M, N=N, K=K))
+    rep = conv_traffic(shape, s.Tm, s.Tn, s.Tk, order, s.bits, s.acc_bits)
+    roof = roofline(order, **s.params())
+    for mode in CONV_MODES:
+        prog = gen_conv(shape, s.Tm, s.Tn, s.Tk, mode, order)
+        if events:
+            res = EventScheduler(s, q_depth).run(prog)
+        else:
+            s.reset(prog); res = s.run()
+        bits = rep["bits"][mode]
+        min_cycles = dict(roof["min_cycles"])
+        for p in PATHS: min_cycles[p] = bits[p] / max(1, s.path_bw(p))
+        mat = 0
+        if mode == "im2col":      # 物化与 GEMM 之间有屏障：写回时间与 GEMM 下界相加
+            mat = math.ceil(M * K * s.bits / max(1, s.path_bw("L0C->L1")))
+            min_cycles = {r: (c + mat if r != "L0C->L1" else c) for r, c in min_cycles.items()}
+        rep[mode] = {"cycles": res["cycles"], "bits": res["bits"], "materialize_cycles": mat,
+                     "lower_bound": math.ceil(max(min_cycles.values())),
+                     "bound": max(min_cycles, key=min_cycles.get)}
+    rep["im2col_overhead"] = rep["im2col"]["cycles"] / rep["implicit"]["cycles"] - 1 if rep["implicit"]["cycles"] else 0.0
+    return rep
+
+
+def roofline(order: str = "MNK", **params) -> Dict:
+    """
+    给定参数（同 Simulator）求 roofline：
+      peak_macs     Cube 峰值 MAC/拍（Tm·Tn，每层 1 拍）
+      intensity     各通路算术强度 MAC/bit
+      ceilings      各资源单独限制下的可达 MAC/拍（Cube 含边界 tile 的填充损失、Vector 后处理、各通路 I·B）
+      bound         限制资源（可达吞吐最小者），attainable 为其值
+      min_cycles    各资源的下界拍数（max 即整体下界）
+    """
+    s = Simulator(**params)
+    macs = s.M * s.N * s.K
+    traffic = gemm_traffic(s.M, s.N, s.K, s.Tm, s.Tn, s.Tk, order, s.bits, s.acc_bits)
+    min_cycles = {"Cube": s.cube_cycles_theory(), "Vector": vector_min_cycles(s)}
+    for p in PATHS:
+        min_cycles[p] = traffic[p] / max(1, s.path_bw(p))
+    ceilings = {r: (macs / c if c else math.inf) for r, c in min_cycles.items()}
+    bound = min(ceilings, key=ceilings.get)
+    return {
+        "order": order, "macs": macs, "peak_macs": s.Tm * s.Tn,
+        "bits": traffic, "bw": {p: s.path_bw(p) for p in PATHS},
+        "intensity": {p: (macs / traffic[p] if traffic[p] else math.inf) for p in PATHS},
+        "ridge": {p: s.Tm * s.Tn / max(1, s.path_bw(p)) for p in PATHS},
+        "ceilings": ceilings, "min_cycles": min_cycles,
+        "bound": bound, "attainable": ceilings[bound],
+    }
+
+
+def place_run(roof: Dict, summary: Dict) -> Dict:
+    """把仿真实测点放到 roofline 上：实测 MAC/拍、实测强度、占可达上界与 Cube 峰值的比例"""
+    cyc = max(1, summary["cycles"])
+    achieved = summary["macs"] / cyc
+    bits = summary.get("bits", {})
+    return {
+        "cycles": summary["cycles"], "achieved": achieved,
+        "intensity": {p: (summary["macs"] / bits[p] if bits.get(p) else math.inf) for p in PATHS},
+        "of_attainable": achieved / roof["attainable"] if roof["attainable"] else 0.0,
+        "of_peak": achieved / roof["peak_macs"],
+        "bound_cycles": max(roof["min_cycles"].values()),
+    }
+
+
+def format_roofline(roof: Dict, point: Optional[Dict] = None) -> str:
+    lines = [f"Roofline ({roof['order']}): {roof['macs']} MACs, Cube peak {roof['peak_macs']} MAC/cycle"]
+    for p in PATHS:
+        lines.append(f"  {p:8s} {roof['bits'][p]:>14d} bits  I={roof['intensity'][p]:8.3f} MAC/bit  "
+                     f"ridge={roof['ridge'][p]:6.3f}  ceiling={roof['ceilings'][p]:10.2f} MAC/cycle")
+    for r in ("Cube", "Vector"):
+        lines.append(f"  {r:8s} ceiling={roof['ceilings'][r]:10.2f} MAC/cycle  ({roof['min_cycles'][r]} cycles)")
+    lines.append(f"  bound: {roof['bound']}  attainable {roof['attainable']:.2f} MAC/cycle")
+    if point:
+        lines.append(f"  measured: {point['achieved']:.2f} MAC/cycle over {point['cycles']} cycles "
+                     f"= {point['of_attainable']:.1%} of attainable, {point['of_peak']:.1%} of peak")
+    return "\n".join(lines)
+
+
+def plot_roofline(roof: Dict, point: Optional[Dict] = None, ax=None):
+    """log-log roofline 图（需要 matplotlib）：每条通路一条斜坡 + Cube 屋顶，标出本配置强度与实测点"""
+    import matplotlib.pyplot as plt     # 可选依赖，只在画图时导入
+    if ax is None: _, ax = plt.subplots()
+    peak = roof["peak_macs"]
+    lo = min(min(roof["intensity"].values()), min(roof["ridge"].values())) / 4
+    hi = max(max(v for v in roof["intensity"].values() if v != math.inf), max(roof["ridge"].values())) * 4
+    xs = [lo * (hi / lo) ** (i / 64) for i in range(65)]
+    for p in PATHS:
+        bw = roof["bw"][p]
+        ax.plot(xs, [min(peak, x * bw) for x in xs], label=f"{p} ({bw} bit/cycle)")
+        ax.plot([roof["intensity"][p]], [roof["ceilings"][p]], "o", color=ax.lines[-1].get_color())
+    ax.axhline(roof["ceilings"]["Cube"], ls="--", color="gray", label="Cube (tile padding)")
+    if point:
+        i = point["intensity"][roof["bound"]] if roof["bound"] in PATHS else min(point["intensity"].values())
+        ax.plot([i], [point["achieved"]], "k*", ms=12, label="measured")
+    ax.set_xscale("log"); ax.set_yscale("log")
+    ax.set_xlabel("arithmetic intensity (MAC/bit)"); ax.set_ylabel("MAC/cycle")
+    ax.set_title(f"bound: {roof['bound']}")
+    ax.legend(fontsize="small")
+    return ax
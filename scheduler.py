@@ -0,0 +1,191 @@
+# scheduler.py
+# 事件驱动调度：按拍数为键的优先队列推进，MTE / Cube / Vector 三条流水并发执行。
+#   - Dispatch 按程序顺序每拍发射 1 条指令到对应单元队列（MTEQ/CubeQ/VectorQ），队列满则阻塞；
+#   - Scalar 指令（取指/译码）由前端顺序执行，Event 指令（EventSync）是屏障：等所有单元排空；
+#   - 单元按队列顺序执行，开始前需 wait 的 flag 计数 > 0（消耗 1），完成时对 sets 的 flag 各 +1。
+# 多 AI Core（run_cores）：每个核各有一份程序、前端、单元队列、flag 与 L0/通路状态，共享同一时钟；
+# 给出 l2_bw 时所有核的搬运还要经过共享的 L2/GM 链路（先到先得，链路上合计不超过 l2_bw bits/拍）。
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+import heapq
+import math
+
+from sim import Instr, PATHS, Simulator, UNITS, SK, stage_info, unit_of
+
+QUEUE_OF = {"MTE": "MTEQ", "Cube": "CubeQ", "Vector": "VectorQ"}
+
+
+class DeadlockError(RuntimeError):
+    pass
+
+
+class EventScheduler:
+    def __init__(self, sim: Simulator, q_depth: int = 8, l2_bw: Optional[int] = None):
+        self.sim = sim
+        self.q_depth = max(1, q_depth)
+        self.l2_bw = l2_bw                # None：不建模共享 L2 带宽
+        # 可选时间线钩子（simtrace.export_chrome 用）；为 None 时不产生任何开销
+        #   on_span(unit, name, stage, start, end, path, bits_per_cycle, core)：一段阶段执行；stage=None 表示整条指令
+        #   on_queue(queue, t, depth, core)：单元队列深度变化
+        self.on_span: Optional[Callable] = None
+        self.on_queue: Optional[Callable] = None
+
+    def initial_flags(self) -> Dict[str, int]:
+        # L0 缓冲空槽：MTE 需要拿到空槽才能写入，缓冲满即停顿
+        return {f"{buf}_free": n for buf, n in self.sim.l0_slots().items()}
+
+    # ---- 单条指令从 t 开始执行：逐阶段计时与计数（与 Simulator.step 的统计口径一致），返回耗时 ----
+    def _execute(self, ins: Instr, t: int, u: str = "", c: int = 0) -> int:
+        s = self.sim
+        span = self.on_span
+        path_free = self.path_free[c]
+        cur = t
+        tm, tn, tk = s.dims_of(ins)
+        for ds in ins.data_stages:
+            k = stage_info(ds).kind
+            if k == SK.CUBE: self.macs[c] += tm * tn * tk
+            elif k == SK.VEC_OP: self.vecops[c] += tm * tn
+            meta = s._bandwidth_for_stage(ds, ins.dims)
+            p = meta["kind"]
+            if p:
+                # 同一通路上的搬运串行占用带宽：通路忙则等待（记为该通路的争用停顿）
+                start = max(cur, path_free[p])
+                end = start + meta["cycles"]
+                if self.l2_bw:
+                    # 共享 L2 链路：按到达顺序占用 bits / l2_bw 拍（按实际份额计忙、可不满一拍），
+                    # 搬运要等链路上的份额传完，完成时刻取整到拍
+                    l2_start = max(start, self.l2_free)
+                    occ = meta["bits"] / self.l2_bw
+                    self.l2_stall += l2_start - start
+                    self.l2_free = l2_start + occ
+                    self.l2_busy += occ
+                    end = max(end, math.ceil(self.l2_free))
+                self.path_stall[c][p] += start - cur
+                cur = path_free[p] = end
+                self.path_busy[c][p] += meta["cycles"]
+                self.bits[c][p] += meta["bits"]
+                if span: span(u, ins.name, ds, start, cur, p, meta["bits_per_cycle"], c)
+            else:
+                c0 = cur
+                cur += s._stage_cycles(ds, ins.dims)
+                if span: span(u, ins.name, ds, c0, cur, None, 0, c)
+        if not ins.data_stages: cur += s.instr_cycles(ins)
+        if span: span(u, ins.name, None, t, cur, None, 0, c)
+        return cur - t
+
+    def run(self, program: Iterable[Instr]) -> Dict:
+        """单核：返回 cycles/instrs/macs/vecops/bits/q_hwm/busy/stall/path_busy/path_stall/util"""
+        return self.run_cores([program])["cores"][0]
+
+    def run_cores(self, programs: Sequence[Iterable[Instr]]) -> Dict:
+        """
+        多核并发：programs[i] 是第 i 个核的指令流。
+        返回 cycles（最晚完成的核）、instrs/macs/vecops/bits 合计、l2_busy/l2_stall/l2_util，
+        以及 cores：每个核一份与 run() 相同格式的统计（cycles 为该核完成时刻）。
+        """
+        nc = len(programs)
+        self.macs = [0] * nc
+        self.vecops = [0] * nc
+        self.bits = [dict.fromkeys(PATHS, 0) for _ in range(nc)]
+        self.path_free = [dict.fromkeys(PATHS, 0) for _ in range(nc)]
+        self.path_busy = [dict.fromkeys(PATHS, 0) for _ in range(nc)]
+        self.path_stall = [dict.fromkeys(PATHS, 0) for _ in range(nc)]
+        self.l2_free = self.l2_busy = self.l2_stall = 0.0
+        init = self.initial_flags()
+        flags = [dict(init) for _ in range(nc)]
+        queues = [{u: deque() for u in QUEUE_OF} for _ in range(nc)]
+        free_at = [{u: 0 for u in UNITS} for _ in range(nc)]     # 单元空闲时刻
+        busy = [{u: 0 for u in UNITS} for _ in range(nc)]
+        stall = [{u: 0 for u in UNITS} for _ in range(nc)]       # 单元空闲但队首指令在等 flag 的拍数
+        hwm = [{q: 0 for q in QUEUE_OF.values()} for _ in range(nc)]
+        heap = []                                                # (完成拍, 序号, 核, 单元, 指令)
+        running = [0] * nc
+        seq = 0
+
+        its = [iter(p) for p in programs]
+        pending: List[Optional[Instr]] = [next(it, None) for it in its]
+        fe_ready = [0] * nc                                      # 前端（Dispatch/Scalar/Event）下一次可发射时刻
+        n = [0] * nc
+        done_at = [0] * nc
+        live = list(range(nc))
+        on_queue = self.on_queue
+        t = 0
+        while True:
+            # 1) 处理 t 时刻及以前完成的指令：置位 flag
+            while heap and heap[0][0] <= t:
+                _, _, c, u, ins = heapq.heappop(heap)
+                running[c] -= 1
+                fl = flags[c]
+                for f in ins.sets: fl[f] = fl.get(f, 0) + 1
+
+            for c in list(live):
+                fl, qs, fa = flags[c], queues[c], free_at[c]
+                progress = True
+                while progress:
+                    progress = False
+                    # 2) 各执行单元：空闲且队首的 flag 就绪则开始
+                    for u, q in qs.items():
+                        if not q or fa[u] > t: continue
+                        ins = q[0]
+                        if any(fl.get(f, 0) <= 0 for f in ins.waits): continue
+                        q.popleft()
+                        if on_queue: on_queue(QUEUE_OF[u], t, len(q), c)
+                        for f in ins.waits: fl[f] -= 1
+                        cyc = self._execute(ins, t, u, c)
+                        fa[u] = t + cyc; busy[c][u] += cyc
+                        heapq.heappush(heap, (t + cyc, seq, c, u, ins)); seq += 1; running[c] += 1
+                        progress = True
+                    # 3) 前端按程序顺序发射
+                    pi = pending[c]
+                    if pi is not None and fe_ready[c] <= t:
+                        u = unit_of(pi)
+                        if u in qs:
+                            if len(qs[u]) < self.q_depth:
+                                qs[u].append(pi)
+                                hwm[c][QUEUE_OF[u]] = max(hwm[c][QUEUE_OF[u]], len(qs[u]))
+                                if on_queue: on_queue(QUEUE_OF[u], t, len(qs[u]), c)
+                                fe_ready[c] = t + 1
+                                pending[c] = next(its[c], None); n[c] += 1; progress = True
+                        elif u == "Scalar" or (running[c] == 0 and not any(qs.values())):
+                            cyc = self._execute(pi, t, u, c)
+                            busy[c][u] += cyc; fa[u] = fe_ready[c] = t + cyc
+                            pending[c] = next(its[c], None); n[c] += 1; progress = True
+
+                if pending[c] is None and running[c] == 0 and not any(qs.values()):
+                    done_at[c] = max(t, fe_ready[c])
+                    live.remove(c)
+
+            if not live:
+                t = max(done_at, default=0)
+                break
+            # 4) 跳到下一个有事可做的拍
+            cands = [heap[0][0]] if heap else []
+            for c in live:
+                if pending[c] is not None and fe_ready[c] > t: cands.append(fe_ready[c])
+                cands += [free_at[c][u] for u, q in queues[c].items() if q and free_at[c][u] > t]
+            if not cands:
+                blocked = {(c, u): q[0].waits for c in live for u, q in queues[c].items() if q}
+                raise DeadlockError(f"t={t}: no progress possible, queue heads waiting on {blocked}, "
+                                    f"flags={[flags[c] for c in live]}")
+            nt = min(cands)
+            for c in live:
+                for u, q in queues[c].items():
+                    if q and free_at[c][u] <= t: stall[c][u] += nt - t
+            t = nt
+
+        cores = []
+        for c in range(nc):
+            tc = done_at[c]
+            cores.append({
+                "cycles": tc, "instrs": n[c], "macs": self.macs[c], "vecops": self.vecops[c],
+                "bits": dict(self.bits[c]), "q_hwm": hwm[c], "busy": busy[c], "stall": stall[c],
+                "path_busy": dict(self.path_busy[c]), "path_stall": dict(self.path_stall[c]),
+                "util": {u: (busy[c][u] / tc if tc else 0.0) for u in UNITS},
+            })
+        return {
+            "cycles": t, "instrs": sum(n), "macs": sum(self.macs), "vecops": sum(self.vecops),
+            "bits": {p: sum(b[p] for b in self.bits) for p in PATHS},
+            "l2_busy": self.l2_busy, "l2_stall": self.l2_stall,
+            "l2_util": self.l2_busy / t if t else 0.0,
+            "cores": cores,
+        }
@@ -1,7 +1,10 @@
 # sim.py
 from dataclasses import dataclass, field
-from typing import List, Callable, Dict
+from enum import IntEnum
+from typing import List, Callable, Dict, Optional, Tuple, Iterable, Iterator, NamedTuple
 import math
+import itertools
+import numpy as np
 
 # ---- 抽象：指令 / 数据事件 ----
 @dataclass
@@ -11,6 +14,10 @@ class Instr:
     data_stages: List[str]      # 数据路径阶段
     ccur: int = 0
     dcur: int = 0
+    unit: str = ""                  # 执行单元：MTE/Cube/Vector/Scalar/Event；空则按阶段名推断
+    waits: Tuple[str, ...] = ()     # 事件调度：开始前消耗的 flag（wait_flag）
+    sets: Tuple[str, ...] = ()      # 事件调度：完成后置位的 flag（set_flag）
+    dims: Optional[Tuple[int, int, int]] = None   # 本指令覆盖的 (tm, tn, tk)；None 表示整块 Tm×Tn 的单层
 
     def ctrl_done(self): return self.ccur >= len(self.ctrl_stages)
     def data_done(self): return self.dcur >= len(self.data_stages)
@@ -23,13 +30,142 @@ class Instr:
     def done(self): return self.ctrl_done() and self.data_done()
 
 
+UNITS = ("Scalar", "MTE", "Cube", "Vector", "Event")
+UNIT_ID = {u: i for i, u in enumerate(UNITS)}
+
+
+# ---- 阶段名驻留：字符串只在首次出现时做子串匹配，之后按整数 id / 种类分派 ----
+class SK(IntEnum):
+    OTHER = 0
+    ENQ_CUBE = 1        # Enqueue(CubeQ...)
+    ENQ_VEC = 2         # Enqueue(VectorQ...)
+    EVENT = 3           # EventSync
+    MTE = 4             # MTE(...) 搬运/整形
+    CUBE = 5            # Cube@k
+    VEC_OP = 6          # Vector(...) 运算（不含 Read）
+    VEC_READ = 7        # Vector(Read ...)
+    WRITE = 8           # Write ... / Spill / Reload（L0C<->L1 端口）
+
+
+class StageInfo(NamedTuple):
+    kind: SK
+    path: str           # 带宽通路（""=不占用）
+    partial: bool       # 部分和（按 acc_bits 计位数）
+
+
+def _classify(stage: str) -> StageInfo:
+    partial = "Spill C(" in stage or "Reload C(" in stage
+    if "MTE(L1->L0A)" in stage: path = "L1->L0A"
+    elif "MTE(L1->L0B)" in stage: path = "L1->L0B"
+    elif "Write C(L1)" in stage or "Write L1" in stage or partial: path = "L0C->L1"     # L0C<->L1 共用端口
+    else: path = ""
+    if "Enqueue(CubeQ" in stage: kind = SK.ENQ_CUBE
+    elif "Enqueue(VectorQ" in stage: kind = SK.ENQ_VEC
+    elif "EventSync" in stage: kind = SK.EVENT
+    elif "MTE(" in stage: kind = SK.MTE
+    elif "Cube@" in stage: kind = SK.CUBE
+    elif "Vector(" in stage: kind = SK.VEC_READ if "Read" in stage else SK.VEC_OP
+    elif path: kind = SK.WRITE
+    else: kind = SK.OTHER
+    return StageInfo(kind, path, partial)
+
+
+STAGES: List[str] = []                  # id -> 阶段名
+STAGE_INFO: List[StageInfo] = []        # id -> 种类/通路
+_STAGE_IDS: Dict[str, int] = {}
+
+def stage_id(stage: str) -> int:
+    i = _STAGE_IDS.get(stage)
+    if i is None:
+        i = _STAGE_IDS[stage] = len(STAGES)
+        STAGES.append(stage); STAGE_INFO.append(_classify(stage))
+    return i
+
+def stage_info(stage: str) -> StageInfo: return STAGE_INFO[stage_id(stage)]
+
+
+def unit_of(ins: Instr) -> str:
+    if ins.unit: return ins.unit
+    kinds = [stage_info(d).kind for d in ins.data_stages]
+    if SK.MTE in kinds: return "MTE"
+    if SK.CUBE in kinds: return "Cube"
+    if kinds: return "Vector"
+    return "Event" if any(stage_info(c).kind == SK.EVENT for c in ins.ctrl_stages) else "Scalar"
+
+
+# ---- 紧凑指令表（struct-of-arrays） ----
+class ProgramTable:
+    """
+    每条指令只存 模板号(uint16) / 单元号(uint8) / tile 尺寸(3×uint16)，共 9 B；
+    阶段 id 序列与 wait/set flag 按模板驻留共享。迭代时按需还原成 Instr（阶段列表为共享元组）。
+    执行游标（ccur/dcur）只属于在途指令，由还原出的 Instr 自己携带，不在表里逐条存。
+    keep_names=False 时不存逐条名字，名字还原为 "<模板首条名字> #<序号>"。
+    """
+    def __init__(self, capacity: int = 1024, keep_names: bool = False):
+        self.n = 0
+        self.tmpl = np.zeros(capacity, np.uint16)
+        self.unit = np.zeros(capacity, np.uint8)
+        self.dims = np.zeros((capacity, 3), np.uint16)
+        self.templates: List[tuple] = []       # (label, ctrl 阶段名, data 阶段名, waits, sets, has_dims, unit)
+        self._tmpl_ids: Dict[tuple, int] = {}
+        self.names: Optional[List[str]] = [] if keep_names else None
+
+    @classmethod
+    def from_instrs(cls, program: Iterable[Instr], keep_names: bool = False) -> "ProgramTable":
+        t = cls(keep_names=keep_names)
+        for ins in program: t.append(ins)
+        return t
+
+    def _grow(self):
+        cap = 2 * len(self.tmpl)
+        self.tmpl = np.resize(self.tmpl, cap)
+        self.unit = np.resize(self.unit, cap)
+        self.dims = np.resize(self.dims, (cap, 3))
+
+    def append(self, ins: Instr):
+        key = (tuple(stage_id(c) for c in ins.ctrl_stages), tuple(stage_id(d) for d in ins.data_stages),
+               tuple(ins.waits), tuple(ins.sets), ins.dims is not None, unit_of(ins))
+        tid = self._tmpl_ids.get(key)
+        if tid is None:
+            tid = self._tmpl_ids[key] = len(self.templates)
+            self.templates.append((ins.name.split(" ")[0], tuple(STAGES[c] for c in key[0]), tuple(STAGES[d] for d in key[1])) + key[2:])
+        if self.n == len(self.tmpl): self._grow()
+        i = self.n
+        self.tmpl[i] = tid
+        self.unit[i] = UNIT_ID[key[-1]]
+        if ins.dims is not None: self.dims[i] = ins.dims
+        if self.names is not None: self.names.append(ins.name)
+        self.n += 1
+
+    def __len__(self): return self.n
+
+    def __getitem__(self, i: int) -> Instr:
+        if i < 0: i += self.n
+        if not 0 <= i < self.n: raise IndexError(i)
+        label, ctrl, data, waits, sets, has_dims, unit = self.templates[self.tmpl[i]]
+        return Instr(self.names[i] if self.names is not None else f"{label} #{i}", ctrl, data,
+                     unit=unit, waits=waits, sets=sets,
+                     dims=tuple(self.dims[i].tolist()) if has_dims else None)
+
+    def __iter__(self) -> Iterator[Instr]:
+        for i in range(self.n): yield self[i]
+
+    def nbytes(self) -> int:
+        return self.n * (self.tmpl.itemsize + self.unit.itemsize + 3 * self.dims.itemsize)
+
+
 # ---- 场景 ----
 def scenario_gemm(K_layers=6) -> List[Instr]:
     ins = [Instr("Fetch/Dispatch", ["IFetch","IDecode","Enqueue(CubeQ,MTEQ)"], [])]
     for k in range(K_layers):
-        ins.append(Instr(f"Feed k={k}", ["(ctrl) wait MTE ready","(ctrl) signal Cube"], ["MTE(L1->L0A)","MTE(L1->L0B)"]))
-        ins.append(Instr(f"Cube layer k={k}", ["(ctrl) Cube exec"], ["Cube@k","Accumulate(L0C)"]))
-    ins.append(Instr("PostOps+Write", ["Enqueue(VectorQ)","(ctrl) Vector exec"], ["Vector(Read L0C)","Vector(Act/FPx)","Write C(L1)"]))
+        # L0A/L0B 槽位：Feed 占用一个槽，Cube 用完释放（槽数 = Simulator.l0_slots()）
+        ins.append(Instr(f"Feed k={k}", ["(ctrl) wait MTE ready","(ctrl) signal Cube"], ["MTE(L1->L0A)","MTE(L1->L0B)"],
+                         waits=("L0A_free","L0B_free"), sets=("AB_ready",)))
+        ins.append(Instr(f"Cube layer k={k}", ["(ctrl) Cube exec"], ["Cube@k","Accumulate(L0C)"],
+                         waits=("AB_ready",) + (("L0C_free",) if k == 0 else ()),
+                         sets=("L0A_free","L0B_free") + (("C_ready",) if k == K_layers-1 else ())))
+    ins.append(Instr("PostOps+Write", ["Enqueue(VectorQ)","(ctrl) Vector exec"], ["Vector(Read L0C)","Vector(Act/FPx)","Write C(L1)"],
+                     waits=("C_ready",) if K_layers else (), sets=("L0C_free",) if K_layers else ()))
     ins.append(Instr("Finish",["EventSync"],[]))
     return ins
 
@@ -38,14 +174,63 @@ def scenario_conv_im2col(tiles=4) -> List[Instr]:
     ins = [Instr("Fetch/Dispatch", ["IFetch","IDecode","Enqueue(MTEQ)"], [])]
     for t in range(tiles):
         ins += [
-            Instr(f"MTE im2col t{t}", ["(ctrl) MTE im2col"], ["MTE(im2col)","MTE(Transpose)"]),
-            Instr(f"Cube GEMM t{t}",  ["(ctrl) Cube exec"],  ["Cube@k","Accumulate(L0C)"])
+            Instr(f"MTE im2col t{t}", ["(ctrl) MTE im2col"], ["MTE(im2col)","MTE(Transpose)"], sets=("A_ready",)),
+            Instr(f"Cube GEMM t{t}",  ["(ctrl) Cube exec"],  ["Cube@k","Accumulate(L0C)"],
+                  waits=("A_ready",), sets=("C_ready",) if t == tiles-1 else ())
         ]
-    ins += [Instr("Vector+Write",["Enqueue(VectorQ)","(ctrl) Vector"],["Vector(Read L0C)","Vector(ReLU)","Write C(L1)"]),
+    ins += [Instr("Vector+Write",["Enqueue(VectorQ)","(ctrl) Vector"],["Vector(Read L0C)","Vector(ReLU)","Write C(L1)"],
+                  waits=("C_ready",) if tiles else ()),
             Instr("Finish",["EventSync"],[])]
     return ins
 
 
+class ConvShape(NamedTuple):
+    """Conv2D 层形状（NCHW 输入，Kout×C×Kh×Kw 权重）"""
+    batch: int = 1
+    C: int = 64
+    H: int = 56
+    W: int = 56
+    Kout: int = 64
+    Kh: int = 3
+    Kw: int = 3
+    stride: int = 1
+    pad: int = 1
+    dilation: int = 1
+
+    @property
+    def Ho(self) -> int: return (self.H + 2*self.pad - self.dilation*(self.Kh - 1) - 1) // self.stride + 1
+    @property
+    def Wo(self) -> int: return (self.W + 2*self.pad - self.dilation*(self.Kw - 1) - 1) // self.stride + 1
+
+    def gemm(self) -> Tuple[int, int, int]:
+        """im2col 展开后的 GEMM 形状：M = batch·Ho·Wo，N = Kout，K = C·Kh·Kw"""
+        return self.batch * self.Ho * self.Wo, self.Kout, self.C * self.Kh * self.Kw
+
+
+CONV_MODES = ("im2col", "implicit")
+
+def gen_conv(shape: ConvShape, Tm, Tn, Tk, mode="im2col", order="MNK") -> Iterator[Instr]:
+    """
+    Conv2D 指令流：
+      im2col   先把特征图展开成 M×K 矩阵写回 L1（每个 Tm×Tk 块一条 MTE 指令，经 L1 写端口），
+               EventSync 之后再对展开矩阵做分块 GEMM；
+      implicit 不物化：L1->L0A 搬运时按窗口就地展开（load3d 式），直接做分块 GEMM。
+    """
+    if mode not in CONV_MODES:
+        raise ValueError(f"unknown conv mode {mode!r}, expected one of {CONV_MODES}")
+    M, N, K = shape.gemm()
+    if mode == "im2col":
+        yield Instr("Fetch/Dispatch im2col", ["IFetch","IDecode","Enqueue(MTEQ)"], [])
+        for mi in range(math.ceil(M / Tm)):
+            for ki in range(math.ceil(K / Tk)):
+                tm, tk = min(Tm, M - mi*Tm), min(Tk, K - ki*Tk)
+                # 写回 L1 的位数按 dims 的 tm×tn 计，这里即展开块 tm×tk
+                yield Instr(f"im2col m{mi} k{ki}", ["(ctrl) MTE im2col"], ["MTE(im2col)","Write L1"],
+                            unit="MTE", dims=(tm, tk, 1))
+        yield Instr("im2col done", ["EventSync"], [])
+    yield from gen_gemm(M, N, K, Tm, Tn, Tk, order)
+
+
 def scenario_vector_only() -> List[Instr]:
     return [
         Instr("Fetch/Dispatch", ["IFetch","IDecode","Enqueue(VectorQ)"], []),
@@ -62,7 +247,84 @@ def scenario_mte_only() -> List[Instr]:
     ]
 
 
+GEMM_ORDERS = ("MNK", "NMK", "KMN")    # KMN = K 最外层（部分和溢出到 L1 再读回）
+
+def gemm_tiles(M, N, K, Tm, Tn, Tk, order="MNK", mn=None) -> Iterator[Tuple[int, int, int, int, int, int]]:
+    """按循环顺序枚举 (mi, ni, ki, tm, tn, tk)，边界 tile 取实际剩余尺寸；
+    mn 给出时只枚举这些输出 tile (mi, ni)（多核划分后每个核的子集），仍按 order 排序"""
+    if order not in GEMM_ORDERS:
+        raise ValueError(f"unknown loop order {order!r}, expected one of {GEMM_ORDERS}")
+    nm, nn, nk = math.ceil(M / Tm), math.ceil(N / Tn), math.ceil(K / Tk)
+    if mn is not None:
+        pairs = sorted(mn, key=(lambda t: (t[1], t[0])) if order == "NMK" else None)
+        if order == "KMN": seq = ((mi, ni, ki) for ki in range(nk) for mi, ni in pairs)
+        else: seq = ((mi, ni, ki) for mi, ni in pairs for ki in range(nk))
+        for mi, ni, ki in seq:
+            yield mi, ni, ki, min(Tm, M - mi*Tm), min(Tn, N - ni*Tn), min(Tk, K - ki*Tk)
+        return
+    ranges = {"M": range(nm), "N": range(nn), "K": range(nk)}
+    for a in ranges[order[0]]:
+        for b in ranges[order[1]]:
+            for c in ranges[order[2]]:
+                idx = dict(zip(order, (a, b, c)))
+                mi, ni, ki = idx["M"], idx["N"], idx["K"]
+                yield mi, ni, ki, min(Tm, M - mi*Tm), min(Tn, N - ni*Tn), min(Tk, K - ki*Tk)
+
+
+def gen_gemm(M, N, K, Tm, Tn, Tk, order="MNK", mn=None) -> Iterator[Instr]:
+    """
+    完整分块 GEMM 指令流（惰性生成，4096³ 也不会一次性构造所有 Instr）：
+    每个 (m,n,k) tile 一条 Feed（L1→L0A/L0B，tm·tk / tk·tn 个元素）+ 一条 Cube（tk 层）；
+    与上一次装入的 A/B tile 相同时跳过搬运（L0 复用），所以循环顺序会改变 L1 流量。
+    MNK/NMK：k 最内层，C tile 在 L0C 累加完成后一次 PostOps+Write；
+    KMN：k 最外层，非末层的部分和写回 L1（Spill），下一层再读回（Reload）。
+    mn：只生成这些输出 tile（见 gemm_tiles），供多核划分使用。
+    """
+    nk = math.ceil(K / Tk)
+    yield Instr("Fetch/Dispatch", ["IFetch","IDecode","Enqueue(CubeQ,MTEQ)"], [])
+    last_a = last_b = None
+    for mi, ni, ki, tm, tn, tk in gemm_tiles(M, N, K, Tm, Tn, Tk, order, mn):
+        dims = (tm, tn, tk)
+        tag = f"m{mi} n{ni} k{ki}"
+        first, last = (ki == 0), (ki == nk - 1)
+        k_inner = order != "KMN"
+        reload = not k_inner and not first      # KMN 非首层：部分和从 L1 读回 L0C
+        loads = []
+        if (mi, ki) != last_a: loads.append("MTE(L1->L0A)"); last_a = (mi, ki)
+        if (ki, ni) != last_b: loads.append("MTE(L1->L0B)"); last_b = (ki, ni)
+        if reload: loads.append("Reload C(L1->L0C)")
+        # 读回部分和要先占一个 L0C 槽，再随 AB_ready 交给 Cube；首层由 Cube 自己占槽
+        yield Instr(f"Feed {tag}", ["(ctrl) wait MTE ready","(ctrl) signal Cube"], loads or ["MTE(reuse L0)"],
+                    unit="MTE", waits=("L0A_free","L0B_free") + (("L0C_free",) if reload else ()),
+                    sets=("AB_ready",), dims=dims)
+        done_c = (last or not k_inner)           # 本 tile 结束后释放 L0C
+        yield Instr(f"Cube {tag}", ["(ctrl) Cube exec"], ["Cube@k","Accumulate(L0C)"],
+                    unit="Cube", waits=("AB_ready",) + (("L0C_free",) if first else ()),
+                    sets=("L0A_free","L0B_free") + (("C_ready",) if done_c else ()), dims=dims)
+        if last:
+            yield Instr(f"PostOps+Write m{mi} n{ni}", ["Enqueue(VectorQ)","(ctrl) Vector exec"],
+                        ["Vector(Read L0C)","Vector(Act/FPx)","Write C(L1)"],
+                        unit="Vector", waits=("C_ready",), sets=("L0C_free",), dims=(tm, tn, tk))
+        elif not k_inner:
+            yield Instr(f"Spill C {tag}", ["(ctrl) Vector exec"], ["Spill C(L0C->L1)"],
+                        unit="Vector", waits=("C_ready",), sets=("L0C_free",), dims=(tm, tn, tk))
+    yield Instr("Finish",["EventSync"],[])
+
+
+def scenario_program(scenario: str, M=64, N=64, K=64, Tm=16, Tn=16, Tk=16, order="MNK",
+                     conv: Optional[ConvShape] = None, conv_mode="im2col", **_) -> Iterable[Instr]:
+    """按 UI 场景名构造程序（GEMM 按参数分块生成；Conv2D 给出 conv 形状时按层生成，否则为固定演示程序）"""
+    if "GEMM" in scenario:       return gen_gemm(M, N, K, Tm, Tn, Tk, order=order)
+    if "Conv2D" in scenario:
+        if conv is not None: return gen_conv(ConvShape(*conv), Tm, Tn, Tk, conv_mode, order)
+        return scenario_conv_im2col(tiles=4)
+    if "Vector-only" in scenario: return scenario_vector_only()
+    return scenario_mte_only()
+
+
 # ---- 仿真器 ----
+PATHS = ("L1->L0A", "L1->L0B", "L0C->L1")    # 带宽通路（scheduler / roofline / simtrace 共用）
+
 @dataclass
 class Simulator:
     program: List[Instr] = field(default_factory=list)
@@ -86,6 +348,14 @@ class Simulator:
     vmax_L1A: int = 4096
     vmax_L1B: int = 2048
     vmax_CW: int  = 2048
+    buf_depth: int = 1              # L0A/L0B/L0C 缓冲深度：1=单缓冲，2=ping-pong，N=N 路
+    l0a_bytes: int = 64 * 1024
+    l0b_bytes: int = 64 * 1024
+    l0c_bytes: int = 256 * 1024
+    acc_bits: int = 32              # L0C 累加精度
+
+    PARAMS = ("M", "N", "K", "Tm", "Tn", "Tk", "bits", "Wv", "gamma_out", "gamma_in",
+              "vmax_L1A", "vmax_L1B", "vmax_CW", "buf_depth", "l0a_bytes", "l0b_bytes", "l0c_bytes", "acc_bits")
 
     # 统计
     macs: int = 0
@@ -93,12 +363,37 @@ class Simulator:
     q_cube: int = 0
     q_vec: int = 0
     q_mte: int = 0
+    cycles: int = 0
+    path_bits: Dict[str, int] = field(default_factory=dict)   # 各带宽通路累计 bits
+    q_hwm: Dict[str, int] = field(default_factory=dict)       # 队列高水位
+    path_cycles: Dict[str, int] = field(default_factory=dict) # 各带宽通路占用拍数
+    path_stall: Dict[str, int] = field(default_factory=dict)  # 各通路争用停顿拍数（逐拍模式下恒为 0）
+    _hold: int = 0                                            # 当前数据阶段剩余拍数
+    _meta: Dict = field(default_factory=dict)
+    trace: Optional[object] = None                            # simtrace.TraceWriter：逐事件记录
 
-    def reset(self, program: List[Instr]):
+    def __post_init__(self):
+        # 构造时给出的 program 无需先 reset 即可 step/run（从第 pc 条开始）
+        self._it = itertools.islice(self.program, self.pc, None)
+        self._ins = next(self._it, None)
+
+    def params(self) -> Dict:
+        return {k: getattr(self, k) for k in self.PARAMS}
+
+    def reset(self, program: Iterable[Instr]):
+        """program 可以是列表，也可以是惰性生成器（如 gen_gemm）"""
         self.program = program
+        self._it = iter(program)
+        self._ins = next(self._it, None)
         self.pc = 0
         self.macs = self.vecops = 0
         self.q_cube = self.q_vec = self.q_mte = 0
+        self.cycles = 0
+        self.path_bits = dict.fromkeys(PATHS, 0)
+        self.q_hwm = {"CubeQ": 0, "VectorQ": 0, "MTEQ": 0}
+        self.path_cycles = dict.fromkeys(PATHS, 0)
+        self.path_stall = dict.fromkeys(PATHS, 0)
+        self._hold = 0
 
     # ====== 模型：Vector 下限与理论拍数 ======
     def suggest_Wv(self, K_tile: int = None) -> float:
@@ -117,44 +412,168 @@ class Simulator:
         return math.ceil(ops / max(1, self.Wv))
 
     # ====== 带宽估算（简洁每拍峰值） ======
-    def _bandwidth_for_stage(self, stage: str) -> Dict:
-        if "MTE(L1->L0A)" in stage:
-            need = self.Tm * self.bits
-            return {"kind":"L1->L0A", "bits_per_cycle": min(self.vmax_L1A, need)}
-        if "MTE(L1->L0B)" in stage:
-            need = self.Tn * self.bits
-            return {"kind":"L1->L0B", "bits_per_cycle": min(self.vmax_L1B, need)}
-        if "Write C(L1)" in stage or "Write L1" in stage:
-            # 简化：按每层产生的C增量估计写流量（通常会缓存在L0C后批量写出）
-            need = self.Tm * self.Tn * max(1, self.bits // max(1, self.Tk))
-            return {"kind":"L0C->L1", "bits_per_cycle": min(self.vmax_CW, need)}
-        return {"kind": "", "bits_per_cycle": 0}
+    def _path_of(self, stage: str) -> str: return stage_info(stage).path
+
+    def dims_of(self, ins: Optional[Instr]) -> Tuple[int, int, int]:
+        return ins.dims if ins is not None and ins.dims else (self.Tm, self.Tn, 1)
+
+    def path_bw(self, path: str) -> int:
+        return dict(zip(PATHS, (self.vmax_L1A, self.vmax_L1B, self.vmax_CW)))[path]
+
+    def _transfer_bits(self, stage: str, dims=None) -> int:
+        """一次搬运的位数：A 段 tm×tk、B 段 tk×tn、C tile 写回 tm×tn（部分和按 acc_bits）"""
+        tm, tn, tk = dims or (self.Tm, self.Tn, 1)
+        info = stage_info(stage)
+        if info.path == "L1->L0A": return tm * tk * self.bits
+        if info.path == "L1->L0B": return tk * tn * self.bits
+        if info.path == "L0C->L1": return tm * tn * (self.acc_bits if info.partial else self.bits)
+        return 0
+
+    def _bandwidth_for_stage(self, stage: str, dims=None) -> Dict:
+        """搬运阶段：耗时 ceil(bits / 通路峰值) 拍，bits_per_cycle 为搬运期间的占用带宽"""
+        path = self._path_of(stage)
+        if not path:
+            return {"kind": "", "bits_per_cycle": 0, "bits": 0, "cycles": 0}
+        need, vmax = self._transfer_bits(stage, dims), max(1, self.path_bw(path))
+        return {"kind": path, "bits_per_cycle": min(vmax, need), "bits": need, "cycles": max(1, math.ceil(need / vmax))}
+
+    # ====== L0 缓冲：容量检查与槽位数 ======
+    def l0_tile_bytes(self) -> Dict[str, int]:
+        return {
+            "L0A": math.ceil(self.Tm * self.Tk * self.bits / 8),
+            "L0B": math.ceil(self.Tk * self.Tn * self.bits / 8),
+            "L0C": math.ceil(self.Tm * self.Tn * self.acc_bits / 8),
+        }
+
+    def l0_slots(self) -> Dict[str, int]:
+        """各 L0 缓冲实际可用槽数 = min(buf_depth, 容量 // 单 tile 字节)；单个 tile 放不下则报错"""
+        caps = {"L0A": self.l0a_bytes, "L0B": self.l0b_bytes, "L0C": self.l0c_bytes}
+        slots = {}
+        for buf, need in self.l0_tile_bytes().items():
+            fit = caps[buf] // max(1, need)
+            if fit < 1:
+                raise ValueError(f"{buf} tile needs {need} B but capacity is {caps[buf]} B")
+            slots[buf] = min(max(1, self.buf_depth), fit)
+        return slots
+
+    # ====== 事件调度用的拍数模型 ======
+    def _stage_cycles(self, stage: str, dims=None) -> int:
+        tm, tn, tk = dims or (self.Tm, self.Tn, 1)
+        info = stage_info(stage)
+        if info.kind == SK.CUBE: return tk                  # 每层 1 拍
+        if info.path: return self._bandwidth_for_stage(stage, dims)["cycles"]
+        if info.kind == SK.VEC_OP:
+            return math.ceil(self.gamma_out * tm * tn / max(1, self.Wv))
+        return 1
+
+    def instr_cycles(self, ins: Instr) -> int:
+        if ins.data_stages: return sum(self._stage_cycles(d, ins.dims) for d in ins.data_stages)
+        return max(1, len(ins.ctrl_stages))
 
     # ====== 时钟推进 ======
+    def finished(self) -> bool: return self._ins is None
+
+    def _track_queues(self):
+        h = self.q_hwm
+        h["CubeQ"] = max(h.get("CubeQ", 0), self.q_cube)
+        h["VectorQ"] = max(h.get("VectorQ", 0), self.q_vec)
+        h["MTEQ"] = max(h.get("MTEQ", 0), self.q_mte)
+
     def step(self):
-        if self.pc >= len(self.program):
+        ins = self._ins
+        if ins is None:
             self.on_done(); return
-        ins = self.program[self.pc]
 
         cs = ins.curr_ctrl()
         if cs:
             self.on_visit_ctrl(cs, ins.name)
-            if "Enqueue(CubeQ" in cs: self.q_cube += 1; self.q_mte += 1
-            if "Enqueue(VectorQ" in cs: self.q_vec += 1
+            k = stage_info(cs).kind
+            if k == SK.ENQ_CUBE: self.q_cube += 1; self.q_mte += 1
+            if k == SK.ENQ_VEC: self.q_vec += 1
+            self._track_queues()
+            if self.trace is not None: self.trace.record(self, ins, cs, 0, 0)
             ins.step_ctrl()
 
         ds = ins.curr_data()
         if ds:
-            meta = self._bandwidth_for_stage(ds)
-            if "Cube@k" in ds:
-                self.macs += self.Tm * self.Tn
-                if self.q_cube>0: self.q_cube -= 1
-            if "Vector(" in ds and "Read" not in ds:
-                self.vecops += self.Tm * self.Tn
-                if self.q_vec>0: self.q_vec -= 1
-            if "MTE(" in ds and self.q_mte>0: self.q_mte -= 1
-
-            self.on_visit_data(ds, ins.name, meta)
-            ins.step_data()
-
-        if ins.done(): self.pc += 1
+            if self._hold == 0:                 # 首次进入该数据阶段
+                tm, tn, tk = self.dims_of(ins)
+                meta = self._meta = self._bandwidth_for_stage(ds, ins.dims)
+                k = stage_info(ds).kind
+                if k == SK.CUBE:
+                    self.macs += tm * tn * tk
+                    if self.q_cube>0: self.q_cube -= 1
+                if k == SK.VEC_OP:
+                    self.vecops += tm * tn
+                    if self.q_vec>0: self.q_vec -= 1
+                if k == SK.MTE and self.q_mte>0: self.q_mte -= 1
+                if meta["kind"]:
+                    self.path_bits[meta["kind"]] = self.path_bits.get(meta["kind"], 0) + meta["bits"]
+                # 搬运 / Cube 多层 / Vector 运算按模型占用多拍
+                self._hold = self._stage_cycles(ds, ins.dims)
+            if self._meta["kind"]:
+                self.path_cycles[self._meta["kind"]] = self.path_cycles.get(self._meta["kind"], 0) + 1
+
+            self.on_visit_data(ds, ins.name, self._meta)
+            if self.trace is not None: self.trace.record(self, ins, ds, 1, self._meta["bits_per_cycle"])
+            self._hold -= 1
+            if self._hold == 0: ins.step_data()
+
+        self.cycles += 1
+        if ins.done():
+            self.pc += 1
+            self._ins = next(self._it, None)
+
+    # ====== 无头批量模式 ======
+    def run(self, max_cycles: Optional[int] = None, quiet: bool = True) -> Dict:
+        """紧循环推进到程序结束（或 max_cycles 拍）；quiet=True 时临时换成空回调，不触发 UI 更新"""
+        saved = (self.on_visit_ctrl, self.on_visit_data, self.on_done)
+        if quiet:
+            self.on_visit_ctrl, self.on_visit_data, self.on_done = _noop, _noop, _noop
+        try:
+            while not self.finished() and (max_cycles is None or self.cycles < max_cycles):
+                self.step()
+        finally:
+            self.on_visit_ctrl, self.on_visit_data, self.on_done = saved
+        return self.summary()
+
+    def run_to_completion(self) -> Dict: return self.run(None)
+
+    def run_events(self, q_depth: int = 8) -> Dict:
+        """事件驱动调度（scheduler.EventScheduler）：MTE/Cube/Vector 按 wait/set flag 并发执行，跑完剩余程序"""
+        from scheduler import EventScheduler
+        rest = itertools.chain([self._ins], self._it) if self._ins is not None else iter(())
+        rep = EventScheduler(self, q_depth=q_depth).run(rest)
+        self.pc += rep["instrs"]
+        self._ins = None
+        self.cycles += rep["cycles"]
+        self.macs += rep["macs"]; self.vecops += rep["vecops"]
+        for k, v in rep["bits"].items(): self.path_bits[k] = self.path_bits.get(k, 0) + v
+        for k, v in rep["path_busy"].items(): self.path_cycles[k] = self.path_cycles.get(k, 0) + v
+        for k, v in rep["path_stall"].items(): self.path_stall[k] = self.path_stall.get(k, 0) + v
+        self.q_hwm = dict(rep["q_hwm"])
+        return rep
+
+    def summary(self) -> Dict:
+        """
+        逐拍与事件两种模式口径相同：path_busy（= path_cycles）为各通路占用拍数，path_stall 为争用停顿拍数。
+        逐拍模式按程序顺序一次只推进一个数据阶段，通路间不会争用，path_stall 恒为 0；
+        run_events 之后累加的是 EventScheduler 统计的停顿。
+        """
+        return {
+            "cycles": self.cycles, "instrs": self.pc, "done": self.finished(),
+            "macs": self.macs, "vecops": self.vecops,
+            "bits": dict(self.path_bits), "path_cycles": dict(self.path_cycles),
+            "path_busy": dict(self.path_cycles), "path_stall": dict(self.path_stall), "q_hwm": dict(self.q_hwm),
+        }
+
+
+def _noop(*args): pass
+
+
+def simulate(program: Iterable[Instr], max_cycles: Optional[int] = None, events: bool = False, **params) -> Dict:
+    """脚本入口：用给定参数（M,N,K,Tm,Tn,Tk,bits,Wv,...）无头跑完一个程序，返回 summary；
+    events=True 时改用事件驱动调度（单元并发，含利用率/停顿统计）"""
+    sim = Simulator(**params)
+    sim.reset(program)
+    return sim.run_events() if events else sim.run(max_cycles)
@@ -0,0 +1,256 @@
+# simtrace.py
+# 二进制 trace：Simulator.step 每个控制/数据事件写一条定长记录，回放时喂给同样的回调。
+# 文件布局：
+#   [0:8)   magic b"ASTRACE1"
+#   [8:16)  footer 偏移（uint64，close 时回填）
+#   [16:F)  定长记录（TRACE_DTYPE，小端）
+#   [F:)    footer：JSON {stages: 阶段名表, names: 指令名表, params: 仿真参数}
+# 另有 Chrome trace-event JSON 导出（chrome://tracing / ui.perfetto.dev 打开）：
+#   每个单元一条轨道（MTE/Cube/Vector/Scalar/Event Sync），q_cube/q_vec/q_mte 与三条带宽通路为计数器轨道。
+from typing import Callable, Dict, List, Optional
+import json
+import struct
+
+import numpy as np
+
+from sim import PATHS, STAGES, UNITS, UNIT_ID, Simulator, stage_id, stage_info, unit_of
+
+MAGIC = b"ASTRACE1"
+HEADER = 16
+TRACE_DTYPE = np.dtype([
+    ("cycle", "<u8"), ("macs", "<u8"), ("vecops", "<u8"),
+    ("bits", "<u4"),            # 数据事件：该拍带宽占用（bits/cycle）
+    ("instr", "<u4"),           # 指令序号（pc）
+    ("stage", "<u2"),           # 阶段 id（footer 里的阶段名表）
+    ("kind", "u1"),             # 0=ctrl 1=data
+    ("unit", "u1"),
+    ("q_cube", "<u2"), ("q_vec", "<u2"), ("q_mte", "<u2"),
+])
+
+
+class TraceWriter:
+    """带缓冲的记录器：攒满 buf_records 条再整块写盘；挂到 Simulator.trace 上即开始记录"""
+    def __init__(self, path: str, params: Optional[Dict] = None, buf_records: int = 1 << 16):
+        self.f = open(path, "wb")
+        self.f.write(MAGIC + struct.pack("<Q", 0))
+        self.buf = np.zeros(buf_records, TRACE_DTYPE)
+        self.n = 0
+        self.count = 0
+        self.names: List[str] = []
+        self.params = dict(params or {})
+
+    def record(self, sim: Simulator, ins, stage: str, kind: int, bits: int):
+        if sim.pc >= len(self.names): self.names.append(ins.name)
+        self.buf[self.n] = (sim.cycles, sim.macs, sim.vecops, bits, sim.pc, stage_id(stage), kind,
+                            UNIT_ID[unit_of(ins)], sim.q_cube, sim.q_vec, sim.q_mte)
+        self.n += 1
+        if self.n == len(self.buf): self.flush()
+
+    def flush(self):
+        if self.n:
+            self.f.write(self.buf[:self.n].tobytes())
+            self.count += self.n; self.n = 0
+
+    def close(self):
+        if self.f.closed: return
+        self.flush()
+        footer = self.f.tell()
+        self.f.write(json.dumps({"stages": list(STAGES), "names": self.names, "params": self.params},
+                                ensure_ascii=False).encode("utf-8"))
+        self.f.seek(8); self.f.write(struct.pack("<Q", footer))
+        self.f.close()
+
+
+class TraceReader:
+    """记录区用 np.memmap 映射，不整体读入内存"""
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            head = f.read(HEADER)
+            if head[:8] != MAGIC: raise ValueError(f"{path}: not an Ascend trace file")
+            footer = struct.unpack("<Q", head[8:])[0]
+            if footer == 0: raise ValueError(f"{path}: trace was not closed")
+            f.seek(footer)
+            meta = json.loads(f.read().decode("utf-8"))
+        n = (footer - HEADER) // TRACE_DTYPE.itemsize
+        self.rec = np.memmap(path, TRACE_DTYPE, mode="r", offset=HEADER, shape=(n,)) if n else np.zeros(0, TRACE_DTYPE)
+        self.stages: List[str] = meta["stages"]
+        self.names: List[str] = meta["names"]
+        self.params: Dict = meta["params"]
+
+    def __len__(self): return len(self.rec)
+
+    def last_cycle(self) -> int: return int(self.rec["cycle"][-1]) if len(self.rec) else 0
+
+
+class TraceReplayer:
+    """
+    回放器：接口与 Simulator 在 UI 侧用到的部分一致（step/finished/计数字段/回调），
+    可直接替换 AscendTopWindow.sim。每次 step 回放同一拍的全部事件；step_back/seek 可前后拖动。
+    """
+    def __init__(self, reader: TraceReader):
+        self.r = reader
+        self.cycles_col = reader.rec["cycle"]
+        self.on_visit_ctrl: Callable[[str, str], None] = lambda stage, name: None
+        self.on_visit_data: Callable[[str, str, Dict], None] = lambda stage, name, meta: None
+        self.on_done: Callable[[], None] = lambda: None
+        self.pos = 0
+        self.cycles = self.macs = self.vecops = 0
+        self.q_cube = self.q_vec = self.q_mte = 0
+
+    def finished(self) -> bool: return self.pos >= len(self.r)
+
+    def _emit(self, i: int):
+        rec = self.r.rec[i]
+        self.cycles, self.macs, self.vecops = int(rec["cycle"]), int(rec["macs"]), int(rec["vecops"])
+        self.q_cube, self.q_vec, self.q_mte = int(rec["q_cube"]), int(rec["q_vec"]), int(rec["q_mte"])
+        stage = self.r.stages[rec["stage"]]
+        name = self.r.names[rec["instr"]] if rec["instr"] < len(self.r.names) else f"#{rec['instr']}"
+        if rec["kind"] == 0:
+            self.on_visit_ctrl(stage, name)
+        else:
+            self.on_visit_data(stage, name, {"kind": stage_info(stage).path, "bits_per_cycle": int(rec["bits"])})
+
+    def _emit_cycle_at(self, i: int):
+        """回放记录 i 所在拍的全部事件，pos 指向下一拍"""
+        c = self.cycles_col[i]
+        lo = int(np.searchsorted(self.cycles_col, c, "left"))
+        hi = int(np.searchsorted(self.cycles_col, c, "right"))
+        for j in range(lo, hi): self._emit(j)
+        self.pos = hi
+
+    def step(self):
+        if self.finished():
+            self.on_done(); return
+        self._emit_cycle_at(self.pos)
+
+    def step_back(self):
+        if self.pos == 0: return
+        cur = self.cycles_col[self.pos - 1]
+        lo = int(np.searchsorted(self.cycles_col, cur, "left"))
+        self._emit_cycle_at(lo - 1 if lo > 0 else 0)
+
+    def seek(self, cycle: int):
+        """跳到 >= cycle 的第一拍并回放该拍"""
+        if not len(self.r): return
+        i = min(int(np.searchsorted(self.cycles_col, cycle, "left")), len(self.r) - 1)
+        self._emit_cycle_at(i)
+
+
+def record_run(path: str, program, **params) -> Dict:
+    """无头跑一遍并写 trace，返回 summary"""
+    sim = Simulator(**params)
+    sim.reset(program)
+    sim.trace = TraceWriter(path, sim.params())
+    try:
+        return sim.run()
+    finally:
+        sim.trace.close(); sim.trace = None
+
+
+# ====== Chrome trace-event 导出 ======
+# 1 拍 = 1 µs（trace-event 的 ts 单位），时间轴读数即拍数
+TRACK_NAMES = {"MTE": "MTE", "Cube": "Cube", "Vector": "Vector", "Scalar": "Scalar", "Event": "Event Sync"}
+TRACK_ORDER = ("MTE", "Cube", "Vector", "Scalar", "Event")
+QUEUE_COUNTER = {"CubeQ": "q_cube", "VectorQ": "q_vec", "MTEQ": "q_mte"}
+
+
+class ChromeTrace:
+    """trace-event 收集器：span 为完整事件（ph=X），counter 为计数器（ph=C），仅在取值变化时记录"""
+    PID = 1
+
+    def __init__(self, title: str = "Ascend sim"):
+        self.events: List[Dict] = [{"name": "process_name", "ph": "M", "pid": self.PID, "args": {"name": title}}]
+        for i, u in enumerate(TRACK_ORDER):
+            tid = UNIT_ID[u]
+            self.events.append({"name": "thread_name", "ph": "M", "pid": self.PID, "tid": tid,
+                                "args": {"name": TRACK_NAMES[u]}})
+            self.events.append({"name": "thread_sort_index", "ph": "M", "pid": self.PID, "tid": tid,
+                                "args": {"sort_index": i}})
+        self._last: Dict[str, int] = {}
+
+    def span(self, unit: str, name: str, start: int, end: int, cat: str = "", **args):
+        ev = {"name": name, "ph": "X", "ts": start, "dur": end - start, "pid": self.PID, "tid": UNIT_ID[unit]}
+        if cat: ev["cat"] = cat
+        if args: ev["args"] = args
+        self.events.append(ev)
+
+    def counter(self, name: str, t: int, value: int):
+        if self._last.get(name) == value: return
+        self._last[name] = value
+        self.events.append({"name": name, "ph": "C", "ts": t, "pid": self.PID, "args": {name: value}})
+
+    def bandwidth(self, path: str, spans):
+        """spans：该通路按时间排序的 (start, end, bits_per_cycle)，相邻搬运首尾相接时不插 0"""
+        name = f"bw {path}"
+        end = None
+        for s, e, bw in spans:
+            if end is not None and s > end: self.counter(name, end, 0)
+            self.counter(name, s, bw)
+            end = e
+        if end is not None: self.counter(name, end, 0)
+
+    def save(self, path: str, metadata: Optional[Dict] = None):
+        doc = {"traceEvents": self.events, "displayTimeUnit": "ms"}
+        if metadata: doc["metadata"] = metadata
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def export_chrome(path: str, program, q_depth: int = 8, **params) -> Dict:
+    """用事件调度器（单元并发）跑一遍程序并导出时间线，返回调度统计"""
+    from scheduler import EventScheduler
+    sim = Simulator(**params)
+    sch = EventScheduler(sim, q_depth)
+    ct = ChromeTrace()
+    bw = {p: [] for p in PATHS}
+
+    def on_span(u, name, stage, start, end, p, bits_per_cycle, core):
+        if stage is None:
+            ct.span(u, name, start, end, cat="instr")
+        else:
+            ct.span(u, stage, start, end, cat=p or "stage", instr=name)
+            if p: bw[p].append((start, end, bits_per_cycle))
+
+    sch.on_span = on_span
+    sch.on_queue = lambda q, t, depth, core: ct.counter(QUEUE_COUNTER[q], t, depth)
+    for q in QUEUE_COUNTER.values(): ct.counter(q, 0, 0)
+    res = sch.run(program)
+    for p, spans in bw.items(): ct.bandwidth(p, spans)
+    ct.save(path, {"params": sim.params(), "mode": "events", "q_depth": sch.q_depth})
+    return res
+
+
+def trace_to_chrome(reader: TraceReader, path: str):
+    """
+    把录制的 .astrace（顺序步进模式）转成 trace-event JSON：
+    同一指令同一阶段的连续记录合并为一段；控制阶段放在 Scalar（前端）轨道。
+    """
+    rec = reader.rec
+    ct = ChromeTrace()
+    n = len(rec)
+    if n:
+        cyc, ins, stg, kind = rec["cycle"], rec["instr"], rec["stage"], rec["kind"]
+        # 段边界：指令/阶段/种类变化或拍数不连续
+        brk = np.ones(n, bool)
+        brk[1:] = (ins[1:] != ins[:-1]) | (stg[1:] != stg[:-1]) | (kind[1:] != kind[:-1]) | (cyc[1:] != cyc[:-1] + 1)
+        starts = np.flatnonzero(brk)
+        ends = np.append(starts[1:], n)
+        names = reader.names
+        bw = {p: [] for p in PATHS}
+        for s, e in zip(starts.tolist(), ends.tolist()):
+            r = rec[s]
+            stage = reader.stages[r["stage"]]
+            i = int(r["instr"])
+            name = names[i] if i < len(names) else f"#{i}"
+            t0, t1 = int(r["cycle"]), int(cyc[e - 1]) + 1
+            unit = "Scalar" if r["kind"] == 0 else UNITS[r["unit"]]
+            ct.span(unit, stage, t0, t1, cat="ctrl" if r["kind"] == 0 else "data", instr=name)
+            p = stage_info(stage).path
+            if r["kind"] and p: bw[p].append((t0, t1, int(r["bits"])))
+        # 队列深度：只在变化处记录
+        for col in QUEUE_COUNTER.values():
+            v = rec[col]
+            ch = np.flatnonzero(np.r_[True, v[1:] != v[:-1]])
+            for j in ch.tolist(): ct.counter(col, int(cyc[j]), int(v[j]))
+        for p, spans in bw.items(): ct.bandwidth(p, spans)
+    ct.save(path, {"params": reader.params, "mode": "step"})
@@ -0,0 +1,180 @@
+# sweep.py
+# 向量化参数扫描：与 sim.Simulator 的解析模型（suggest_Wv / cube_cycles_theory /
+# vector_cycles_theory / _bandwidth_for_stage）逐项对应，但一次处理整批参数点。
+# 另有 run_sweep：把互相独立的完整仿真分块分发到进程池（每个仿真是单线程纯 Python），
+# 结果汇总成列式结构化数组，可存 CSV。
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import itertools
+import os
+
+import numpy as np
+
+from sim import PATHS, Simulator
+from costcache import CostCache, canonical_key, run_config, sim_key
+
+SWEEP_KEYS = ("M", "N", "K", "Tm", "Tn", "Tk", "bits", "Wv", "gamma_out", "gamma_in",
+              "vmax_L1A", "vmax_L1B", "vmax_CW")
+_FLOAT_KEYS = ("gamma_out", "gamma_in")
+
+
+def _ceil_div(a, b): return -(-a // b)
+
+
+def sweep_theory(M=64, N=64, K=64, Tm=16, Tn=16, Tk=16, bits=16, Wv=32,
+                 gamma_out=1.0, gamma_in=0.0, vmax_L1A=4096, vmax_L1B=2048, vmax_CW=2048,
+                 grid: bool = False, K_tile=None) -> Dict[str, np.ndarray]:
+    """
+    每个参数可为标量或数组：
+      grid=False：按 NumPy 广播逐点组合（数组需同形或可广播）；
+      grid=True ：对所有非标量参数做笛卡尔积，结果形状为各参数长度依次排列。
+    返回同形数组：cube_cycles / vector_cycles / suggest_Wv，
+    各通路单次搬运位数 need_*（与 gen_gemm 的一条 Feed / 写回一致：A 段 Tm×Tk、B 段 Tk×Tn、C tile Tm×Tn）、
+    搬运期间占用带宽 bw_*（按 vmax 截断，与带宽条一致）、
+    单次搬运拍数 xfer_* 以及 peak_bw。
+    """
+    vals = dict(M=M, N=N, K=K, Tm=Tm, Tn=Tn, Tk=Tk, bits=bits, Wv=Wv, gamma_out=gamma_out,
+                gamma_in=gamma_in, vmax_L1A=vmax_L1A, vmax_L1B=vmax_L1B, vmax_CW=vmax_CW)
+    arrs = {k: np.asarray(v, dtype=np.float64 if k in _FLOAT_KEYS else np.int64) for k, v in vals.items()}
+    if grid:
+        axes = [k for k in SWEEP_KEYS if arrs[k].ndim > 0]
+        mesh = np.meshgrid(*[arrs[k].ravel() for k in axes], indexing="ij", sparse=True)
+        arrs.update(zip(axes, mesh))
+    p = arrs
+    Kt = p["K"] if K_tile is None else np.asarray(K_tile, dtype=np.int64)
+
+    # Cube：每 tile 每层 1 拍
+    cube = _ceil_div(p["M"], p["Tm"]) * _ceil_div(p["N"], p["Tn"]) * p["K"]
+    # Vector：下限宽度与理论拍数
+    tile = p["Tm"] * p["Tn"]
+    wv_need = p["gamma_out"] * tile / np.maximum(1, Kt) + p["gamma_in"] * (p["Tm"] + p["Tn"])
+    ops = p["gamma_out"] * tile + p["gamma_in"] * Kt * (p["Tm"] + p["Tn"])
+    vec = np.ceil(ops / np.maximum(1, p["Wv"])).astype(np.int64)
+    # 搬运：单次位数、占用带宽（bits/cycle）
+    need_a = p["Tm"] * p["Tk"] * p["bits"]
+    need_b = p["Tk"] * p["Tn"] * p["bits"]
+    need_c = tile * p["bits"]
+    bw_a = np.minimum(p["vmax_L1A"], need_a)
+    bw_b = np.minimum(p["vmax_L1B"], need_b)
+    bw_c = np.minimum(p["vmax_CW"], need_c)
+
+    out = dict(cube_cycles=cube, vector_cycles=vec, suggest_Wv=wv_need,
+               need_L1A=need_a, need_L1B=need_b, need_CW=need_c,
+               bw_L1A=bw_a, bw_L1B=bw_b, bw_CW=bw_c,
+               peak_bw=np.maximum(np.maximum(bw_a, bw_b), bw_c),
+               # 单次搬运拍数 ceil(bits / 峰值)
+               xfer_L1A=_ceil_div(need_a, np.maximum(1, p["vmax_L1A"])),
+               xfer_L1B=_ceil_div(need_b, np.maximum(1, p["vmax_L1B"])),
+               xfer_CW=_ceil_div(need_c, np.maximum(1, p["vmax_CW"])))
+    shape = np.broadcast_shapes(*[np.shape(v) for v in out.values()])
+    return {k: np.broadcast_to(v, shape) for k, v in out.items()}
+
+
+# ====== 进程池完整仿真扫描 ======
+PATH_COLS = dict(zip(PATHS, ("bits_L1A", "bits_L1B", "bits_CW")))
+RESULT_COLS = ("cycles", "instrs", "macs", "vecops") + tuple(PATH_COLS.values())
+UTIL_COLS = ("util_MTE", "util_Cube", "util_Vector")
+
+
+def param_grid(**axes) -> List[Dict]:
+    """笛卡尔积展开：param_grid(Tm=[16, 32], order=["MNK", "KMN"]) -> 4 个配置 dict"""
+    keys = list(axes)
+    vals = [v if isinstance(v, (list, tuple, range, np.ndarray)) else [v] for v in axes.values()]
+    return [dict(zip(keys, combo)) for combo in itertools.product(*vals)]
+
+
+def _split(cfg: Dict) -> Tuple[str, str, Dict]:
+    cfg = dict(cfg)
+    return cfg.pop("scenario", "GEMM"), cfg.pop("order", "MNK"), cfg
+
+
+def _run_chunk(chunk: List[Tuple[int, Dict]], events: bool, q_depth: int) -> List[Tuple[int, Dict]]:
+    """工作进程：顺序跑一块配置"""
+    out = []
+    for i, cfg in chunk:
+        scenario, order, params = _split(cfg)
+        out.append((i, run_config(scenario, order, events, q_depth, **params)))
+    return out
+
+
+def _table(configs: Sequence[Dict], results: Sequence[Dict], events: bool) -> np.ndarray:
+    """配置列 + 结果列的结构化数组（字符串列为定长 Unicode）"""
+    pkeys = [k for k in Simulator.PARAMS if any(k in c for c in configs)]
+    extra = sorted({k for c in configs for k in c} - set(pkeys))       # order / scenario 等
+    defaults = Simulator().params()
+    fields = []
+    for k in pkeys:
+        fields.append((k, "f8" if isinstance(defaults[k], float) else "i8"))
+    for k in extra:
+        width = max(len(str(c.get(k, ""))) for c in configs)
+        fields.append((k, f"U{max(1, width)}"))
+    fields += [(k, "i8") for k in RESULT_COLS]
+    if events: fields += [(k, "f8") for k in UTIL_COLS]
+    tab = np.zeros(len(configs), np.dtype(fields))
+    for i, (c, r) in enumerate(zip(configs, results)):
+        row = [c.get(k, defaults[k]) for k in pkeys] + [str(c.get(k, "")) for k in extra]
+        row += [r["cycles"], r["instrs"], r["macs"], r["vecops"]] + [r["bits"].get(p, 0) for p in PATH_COLS]
+        if events: row += [r["util"][u] for u in ("MTE", "Cube", "Vector")]
+        tab[i] = tuple(row)
+    return tab
+
+
+def run_sweep(configs: Iterable[Dict], workers: Optional[int] = None, chunksize: int = 4,
+              events: bool = False, q_depth: int = 8, cache: Optional[CostCache] = None,
+              progress: Optional[Callable[[int, int], None]] = None) -> np.ndarray:
+    """
+    configs：每项为 Simulator 参数 dict，可另带 scenario（默认 GEMM）与 order（默认 MNK）。
+    按 chunksize 打包提交，同时在途的块数限制为 2×workers；progress(done, total) 每完成一块回调一次。
+    给出 cache 时先查缓存，只把未命中的配置发给进程池，结果写回缓存。
+    workers=0 时在当前进程里顺序执行（调试用）。
+    """
+    configs = list(configs)
+    total = len(configs)
+    results: List[Optional[Dict]] = [None] * total
+    keys = {}
+    todo = []
+    for i, cfg in enumerate(configs):
+        if cache is not None:
+            scenario, order, params = _split(cfg)
+            keys[i] = canonical_key("simulate", sim_key(Simulator(**params).params(), order, events, q_depth), scenario)
+            hit = cache.get(keys[i])
+            if hit is not None:
+                results[i] = hit; continue
+        todo.append((i, cfg))
+    done = total - len(todo)
+    if progress: progress(done, total)
+
+    def collect(pairs):
+        nonlocal done
+        for i, r in pairs:
+            results[i] = r
+            if cache is not None: cache.put(keys[i], r)
+        done += len(pairs)
+        if progress: progress(done, total)
+
+    chunks = [todo[j:j + chunksize] for j in range(0, len(todo), max(1, chunksize))]
+    if workers == 0:
+        for ch in chunks: collect(_run_chunk(ch, events, q_depth))
+    elif chunks:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            it = iter(chunks)
+            pending = set()
+            for ch in itertools.islice(it, 2 * workers):
+                pending.add(pool.submit(_run_chunk, ch, events, q_depth))
+            while pending:
+                fin, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for f in fin:
+                    collect(f.result())
+                for ch in itertools.islice(it, len(fin)):
+                    pending.add(pool.submit(_run_chunk, ch, events, q_depth))
+    return _table(configs, results, events)
+
+
+def save_csv(table: np.ndarray, path: str):
+    """结构化数组按列名写 CSV"""
+    import csv
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(table.dtype.names)
+        w.writerows(row.tolist() for row in table)
@@ -0,0 +1,32 @@
+# test_nz_convert.py
+import numpy as np
+import pytest
+
+from nz_convert import cli, convert_file
+
+
+def test_converted_input_is_skipped_and_unchanged(tmp_path):
+    src = tmp_path / "w.nz.npy"
+    data = np.arange(4 * 63 * 16 * 16, dtype=np.float32).reshape(4, 63, 16, 16)
+    np.save(src, data)
+    assert cli([str(src), "--to", "nz", "-j", "0"]) == 0
+    assert np.array_equal(np.load(src), data)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["w.nz.npy"]
+
+
+def test_convert_file_refuses_to_overwrite_its_input(tmp_path):
+    src = tmp_path / "x.npy"
+    data = np.arange(40 * 50, dtype=np.int16).reshape(40, 50)
+    np.save(src, data)
+    with pytest.raises(ValueError):
+        convert_file(str(src), str(src), to="nz")
+    assert np.array_equal(np.load(src), data)
+
+
+def test_duplicate_outputs_are_rejected(tmp_path):
+    for d in ("a", "b"):
+        (tmp_path / d).mkdir()
+        np.save(tmp_path / d / "x.npy", np.zeros((20, 20), np.float32))
+    out = tmp_path / "out"
+    assert cli([str(tmp_path / "a" / "x.npy"), str(tmp_path / "b" / "x.npy"), "-o", str(out), "-j", "2"]) == 2
+    assert list(out.iterdir()) == []
@@ -0,0 +1,27 @@
+# test_roofline.py
+import math
+
+import pytest
+
+from roofline import roofline
+from scheduler import EventScheduler
+from sim import Simulator, gen_gemm
+
+# 均含 M % Tm != 0 或 N % Tn != 0 的边界 tile
+BOUNDARY_SHAPES = [
+    dict(M=101, N=11, K=8, Tm=16, Tn=32, Tk=16),
+    dict(M=100, N=40, K=100, Tm=128, Tn=64, Tk=128, Wv=8),
+    dict(M=33, N=70, K=45, Tm=32, Tn=16, Tk=16, Wv=16, gamma_out=2.0),
+    dict(M=17, N=17, K=17, Tm=16, Tn=16, Tk=16, Wv=8, buf_depth=2),
+]
+
+
+@pytest.mark.parametrize("order", ["MNK", "NMK", "KMN"])
+@pytest.mark.parametrize("p", BOUNDARY_SHAPES)
+def test_lower_bound_not_above_simulated(p, order):
+    lb = math.ceil(max(roofline(order, **p)["min_cycles"].values()))
+    prog = lambda: gen_gemm(p["M"], p["N"], p["K"], p["Tm"], p["Tn"], p["Tk"], order)
+    events = EventScheduler(Simulator(**p)).run(prog())["cycles"]
+    s = Simulator(**p); s.reset(prog())
+    assert lb <= events
+    assert lb <= s.run()["cycles"]
@@ -0,0 +1,19 @@
+# test_tuner.py
+import pytest
+
+from tuner import Tuner
+
+
+def _key(front):
+    return [(r["Tm"], r["Tn"], r["Tk"], r["order"], r["cycles"], r["traffic"]) for r in front]
+
+
+@pytest.mark.parametrize("shape, kw", [
+    ((100, 40, 100), dict(sizes=(16, 32, 64, 128), Wv=8)),
+    ((100, 70, 60), dict(sizes=(16, 32, 64), Wv=8, buf_depth=2)),
+])
+def test_pruned_front_matches_exhaustive(shape, kw):
+    t = Tuner(*shape, method="sim", **kw)
+    front = t.run()
+    assert t.pruned > 0
+    assert _key(front) == _key(Tuner(*shape, method="sim", prune=False, **kw).run())
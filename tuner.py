@@ -0,0 +1,111 @@
+# tuner.py
+# 自动调优：在 L0A/L0B/L0C 容量约束下搜索 Cube tile (Tm, Tn, Tk)、循环顺序与 Vector 宽度 Wv，
+# 给出 M,N,K 下「拍数 vs L1 流量」的 Pareto 前沿。
+#   - 流量按 roofline.gemm_traffic 闭式精确求得；拍数下界取 roofline 各资源下界的最大值；
+#   - method="model" 直接以下界打分；method="sim" 用事件调度器实跑，
+#     按下界升序评估，下界已被前沿上某点（拍数 ≤ 下界且流量 ≤ 本点）支配的候选直接剪掉
+#     （下界按各资源串行占用求得、含边界 tile 的实际尺寸，不会高于实跑拍数，剪枝不丢前沿点）；
+#   - 已评估的点缓存在 Tuner.cache（costcache.CostCache；传入带 path 的缓存即可跨进程/崩溃后复用）。
+from typing import Dict, Iterable, List, Optional, Sequence
+import itertools
+import math
+
+from sim import GEMM_ORDERS, Simulator
+from roofline import roofline
+from costcache import CostCache, cached_simulate
+
+TILE_SIZES = (16, 32, 64, 128, 256)
+WV_CHOICES = (8, 16, 32, 64, 128, 256)
+
+
+def tile_choices(dim: int, sizes: Sequence[int] = TILE_SIZES) -> List[int]:
+    """不超过 dim 的候选，外加第一个 ≥ dim 的（单 tile 覆盖整维）"""
+    out = [s for s in sizes if s < dim]
+    big = [s for s in sizes if s >= dim]
+    if big: out.append(min(big))
+    return out or [max(sizes)]
+
+
+def pick_Wv(sim: Simulator, choices: Sequence[int] = WV_CHOICES) -> int:
+    """满足 suggest_Wv 的最小候选宽度（都不够则取最大）"""
+    need = sim.suggest_Wv()
+    ok = [w for w in sorted(choices) if w >= need]
+    return ok[0] if ok else max(choices)
+
+
+def pareto_front(points: Iterable[Dict], x: str = "cycles", y: str = "traffic") -> List[Dict]:
+    """两目标都越小越好；按 x 升序返回非支配点（x 相同取 y 更小者）"""
+    front, best_y = [], math.inf
+    for p in sorted(points, key=lambda p: (p[x], p[y])):
+        if p[y] < best_y:
+            front.append(p); best_y = p[y]
+    return front
+
+
+class Tuner:
+    """
+    params 为其余 Simulator 参数（bits、带宽、L0 容量、buf_depth...）。
+    Wv=None 时每个 tile 按 pick_Wv 自动选宽度，否则固定。prune=False 时逐个评估全部候选（对照用）。
+    """
+    def __init__(self, M: int, N: int, K: int, method: str = "model", orders: Sequence[str] = GEMM_ORDERS,
+                 sizes: Sequence[int] = TILE_SIZES, Wv: Optional[int] = None,
+                 wv_choices: Sequence[int] = WV_CHOICES, q_depth: int = 8,
+                 cache: Optional[CostCache] = None, prune: bool = True, **params):
+        if method not in ("model", "sim"):
+            raise ValueError(f"unknown method {method!r}, expected 'model' or 'sim'")
+        self.M, self.N, self.K = M, N, K
+        self.method, self.orders, self.sizes = method, tuple(orders), tuple(sizes)
+        self.Wv, self.wv_choices, self.q_depth = Wv, tuple(wv_choices), q_depth
+        self.prune = prune
+        self.params = params
+        self.cache = cache if cache is not None else CostCache()
+        self.evaluated = self.pruned = self.infeasible = 0
+
+    # ---- 候选生成：容量不满足的 tile 直接丢弃 ----
+    def candidates(self) -> List[Dict]:
+        out = []
+        for Tm, Tn, Tk in itertools.product(tile_choices(self.M, self.sizes), tile_choices(self.N, self.sizes),
+                                            tile_choices(self.K, self.sizes)):
+            s = Simulator(M=self.M, N=self.N, K=self.K, Tm=Tm, Tn=Tn, Tk=Tk, **self.params)
+            try:
+                slots = s.l0_slots()
+            except ValueError:
+                self.infeasible += 1; continue
+            s.Wv = self.Wv if self.Wv is not None else pick_Wv(s, self.wv_choices)
+            for order in self.orders:
+                roof = roofline(order, **s.params())
+                bits = roof["bits"]
+                out.append({"Tm": Tm, "Tn": Tn, "Tk": Tk, "order": order, "Wv": s.Wv, "slots": slots,
+                            "bits": bits, "traffic": sum(bits.values()),
+                            "lower_bound": math.ceil(max(roof["min_cycles"].values())), "bound": roof["bound"]})
+        return out
+
+    def evaluate(self, c: Dict) -> Dict:
+        r = dict(c, method=self.method)
+        if self.method == "model":
+            r["cycles"] = c["lower_bound"]
+        else:
+            p = dict(self.params, M=self.M, N=self.N, K=self.K, Tm=c["Tm"], Tn=c["Tn"], Tk=c["Tk"], Wv=c["Wv"])
+            res = cached_simulate("GEMM", c["order"], events=True, q_depth=self.q_depth, cache=self.cache, **p)
+            r["cycles"], r["util"] = res["cycles"], res["util"]
+        self.evaluated += 1
+        return r
+
+    def run(self) -> List[Dict]:
+        """返回 Pareto 前沿（按拍数升序）；evaluated/pruned/infeasible 记录搜索统计"""
+        self.evaluated = self.pruned = self.infeasible = 0
+        cands = sorted(self.candidates(), key=lambda c: (c["lower_bound"], c["traffic"]))
+        done: List[Dict] = []
+        front: List[Dict] = []
+        for c in cands:
+            # 分支定界：下界也无法越过已有前沿（存在拍数 ≤ 下界且流量 ≤ 本点的已评估点）
+            if self.prune and any(f["cycles"] <= c["lower_bound"] and f["traffic"] <= c["traffic"] for f in front):
+                self.pruned += 1; continue
+            done.append(self.evaluate(c))
+            front = pareto_front(done)
+        return front
+
+
+def tune(M: int, N: int, K: int, method: str = "model", **kw) -> List[Dict]:
+    """脚本入口：tune(1024, 1024, 1024, method="sim", buf_depth=2)"""
+    return Tuner(M, N, K, method=method, **kw).run()
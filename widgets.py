@@ -154,7 +154,8 @@
 #         self.canvas.draw_idle()
 
 # widgets.py
-from typing import Optional
+from typing import Optional, Iterable
+from collections import deque
 import time
 
 try:
@@ -162,14 +163,14 @@ try:
     from PyQt5.QtWidgets import (
         QWidget, QFrame, QLabel, QVBoxLayout, QHBoxLayout, QPushButton, QSlider,
         QComboBox, QTextEdit, QSizePolicy, QProgressBar, QSpinBox, QFormLayout,
-        QDoubleSpinBox
+        QDoubleSpinBox, QCheckBox
     )
 except Exception:
     from PyQt6.QtCore import Qt, QTimer, pyqtSignal
     from PyQt6.QtWidgets import (
         QWidget, QFrame, QLabel, QVBoxLayout, QHBoxLayout, QPushButton, QSlider,
         QComboBox, QTextEdit, QSizePolicy, QProgressBar, QSpinBox, QFormLayout,
-        QDoubleSpinBox
+        QDoubleSpinBox, QCheckBox
     )
 
 
@@ -182,7 +183,8 @@ class ClickableCard(QFrame):
         super().__init__(parent)
         self._border = border
         self.setFrameShape(QFrame.Shape.StyledPanel)
-        self.setStyleSheet(f"""
+        # 基础 / 高亮样式表预先拼好，切换时整体替换，样式表长度不随 tick 增长
+        self._qss_base = f"""
             QFrame {{
                 background: {color};
                 border-radius: 12px;
@@ -190,7 +192,10 @@ class ClickableCard(QFrame):
             }}
             QLabel[role='title'] {{ font-weight: 700; }}
             QLabel[role='sub'] {{ color: #333; }}
-        """)
+        """
+        self._qss_active = {}      # tint -> 高亮样式表
+        self._tint = None          # 当前高亮色（None=未高亮）
+        self.setStyleSheet(self._qss_base)
         self.setSizePolicy(QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Preferred)
         lay = QVBoxLayout(self); lay.setContentsMargins(10, 8, 10, 8); lay.setSpacing(2)
         self.lblTitle = QLabel(title); self.lblTitle.setProperty("role", "title")
@@ -204,9 +209,15 @@ class ClickableCard(QFrame):
         if e.button() == Qt.MouseButton.LeftButton: self.doubleClicked.emit()
 
     def set_active(self, on: bool, tint="#4f7cff"):
-        self.setStyleSheet(self.styleSheet() + (f"""
-            QFrame {{ border: 2px solid {tint}; }}
-        """ if on else f"QFrame {{ border: 1px solid {self._border}; }}"))
+        state = tint if on else None
+        if state == self._tint: return
+        self._tint = state
+        if not on:
+            self.setStyleSheet(self._qss_base); return
+        qss = self._qss_active.get(tint)
+        if qss is None:
+            qss = self._qss_active[tint] = self._qss_base + f"QFrame {{ border: 2px solid {tint}; }}"
+        self.setStyleSheet(qss)
 
     def set_badge(self, text: str):
         self.lblSub.setText(text)
@@ -247,8 +258,11 @@ class ControlBar(QWidget):
     step = pyqtSignal()
     reset = pyqtSignal()
     speedChanged = pyqtSignal(int)
+    cyclesPerFrameChanged = pyqtSignal(int)     # 0 = 尽可能快
+    workerToggled = pyqtSignal(bool)
     scenarioChanged = pyqtSignal(str)
     paramsApplied = pyqtSignal()
+    autoTuneRequested = pyqtSignal()
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -263,9 +277,13 @@ class ControlBar(QWidget):
         )
         self.speed = QSlider(Qt.Orientation.Horizontal); self.speed.setRange(60, 1200); self.speed.setValue(380)
         self.lblSpeed = QLabel("Speed: 380 ms/tick")
+        self.spCpf = QSpinBox(); self.spCpf.setRange(0, 1000000); self.spCpf.setValue(1)
+        self.spCpf.setSpecialValueText("max")       # 0：每帧尽可能多跑
         for b in (self.btnStart,self.btnPause,self.btnStep,self.btnReset): line1.addWidget(b)
         line1.addWidget(QLabel("Scenario:")); line1.addWidget(self.cbxScenario)
         line1.addStretch(1); line1.addWidget(self.lblSpeed); line1.addWidget(self.speed)
+        line1.addWidget(QLabel("Cycles/tick:")); line1.addWidget(self.spCpf)
+        self.chkWorker = QCheckBox("Background process"); line1.addWidget(self.chkWorker)
 
         self.btnStart.clicked.connect(self.start.emit)
         self.btnPause.clicked.connect(self.pause.emit)
@@ -273,6 +291,8 @@ class ControlBar(QWidget):
         self.btnReset.clicked.connect(self.reset.emit)
         self.speed.valueChanged.connect(lambda v: (self.lblSpeed.setText(f"Speed: {v} ms/tick"), self.speedChanged.emit(v)))
         self.cbxScenario.currentTextChanged.connect(self.scenarioChanged.emit)
+        self.spCpf.valueChanged.connect(self.cyclesPerFrameChanged.emit)
+        self.chkWorker.toggled.connect(self.workerToggled.emit)
 
         # 第二行：参数表
         box = QFrame(); box.setStyleSheet("QFrame{background:#f7fbff;border:1px solid #d7e3f4;border-radius:10px;}")
@@ -296,8 +316,11 @@ class ControlBar(QWidget):
         self.spBW_A = QSpinBox(); self.spBW_A.setRange(128, 16384); self.spBW_A.setValue(4096)  # L1->L0A
         self.spBW_B = QSpinBox(); self.spBW_B.setRange(128, 16384); self.spBW_B.setValue(2048)  # L1->L0B
         self.spBW_C = QSpinBox(); self.spBW_C.setRange(128, 16384); self.spBW_C.setValue(2048)  # L0C->L1
+        self.spDepth = QSpinBox(); self.spDepth.setRange(1, 8); self.spDepth.setValue(1)       # L0A/L0B/L0C 缓冲深度
+        self.cbxOrder = QComboBox(); self.cbxOrder.addItems(["MNK", "NMK", "KMN"])              # GEMM 循环顺序
 
         self.btnApply = QPushButton("Apply Params")
+        self.btnTune = QPushButton("Auto-tune Tiles")
 
         form.addRow("Matrix M×N×K:", self._row(self.spM, self.spN, self.spK))
         form.addRow("Cube Tile Tm×Tn×Tk:", self._row(self.spTm, self.spTn, self.spTk))
@@ -306,9 +329,12 @@ class ControlBar(QWidget):
         form.addRow("γ_out (per C elem):", self.spGo)
         form.addRow("γ_in (per A/B elem):", self.spGi)
         form.addRow("Max BW (bits/cycle)  A/B/C:", self._row(self.spBW_A, self.spBW_B, self.spBW_C))
-        form.addRow(self.btnApply)
+        form.addRow("L0 Buffer Depth (1=single, 2=ping-pong):", self.spDepth)
+        form.addRow("GEMM Loop Order (KMN=K-outer):", self.cbxOrder)
+        form.addRow(self._row(self.btnApply, self.btnTune))
 
         self.btnApply.clicked.connect(self.paramsApplied.emit)
+        self.btnTune.clicked.connect(self.autoTuneRequested.emit)
 
     def _row(self, *widgets):
         w = QWidget(); h = QHBoxLayout(w); h.setContentsMargins(0,0,0,0); h.setSpacing(6)
@@ -319,14 +345,68 @@ class ControlBar(QWidget):
 
 # ---------- 日志 ----------
 class LogPane(QTextEdit):
-    def __init__(self, parent=None):
+    """
+    环形缓冲日志：最多保留 capacity 行；log() 只入缓冲，定时器每帧把新增行批量刷到视图。
+    级别按消息前缀 [CTRL]/[DATA]/[PARAM] 识别，可用 set_levels 过滤；无前缀的消息总是显示。
+    spill_to(path) 把完整日志写入文件，mirror=False 时不再进视图。
+    """
+    LEVELS = ("CTRL", "DATA", "PARAM")
+
+    def __init__(self, parent=None, capacity: int = 2000, flush_ms: int = 33):
         super().__init__(parent)
         self.setReadOnly(True)
         self.setStyleSheet("QTextEdit{background:#0b1220;color:#d6e3ff;border-radius:8px;padding:8px;}")
+        self.document().setMaximumBlockCount(capacity)
+        self._lines = deque(maxlen=capacity)     # (level, line)
+        self._pending = deque(maxlen=capacity)   # 自上次刷新以来的新行
+        self._levels = set(self.LEVELS)
+        self._spill = None
+        self._mirror = True
+        self._timer = QTimer(self); self._timer.timeout.connect(self.flush); self._timer.start(flush_ms)
+
+    @staticmethod
+    def _level_of(msg: str) -> str:
+        if msg.startswith("["):
+            tag = msg[1:msg.find("]")]
+            if tag in LogPane.LEVELS: return tag
+        return ""
+
     def log(self, msg: str):
-        ts = time.strftime("%H:%M:%S")
-        self.append(f"[{ts}] {msg}")
-        self.moveCursor(self.textCursor().End)
+        line = f"[{time.strftime('%H:%M:%S')}] {msg}"
+        if self._spill is not None:
+            self._spill.write(line + "\n")
+            if not self._mirror: return
+        item = (self._level_of(msg), line)
+        self._lines.append(item)
+        self._pending.append(item)
+
+    def flush(self):
+        if not self._pending: return
+        text = "\n".join(line for lvl, line in self._pending if not lvl or lvl in self._levels)
+        self._pending.clear()
+        if text:
+            self.append(text)
+            self.moveCursor(self.textCursor().End)
+
+    def set_levels(self, levels: Iterable[str]):
+        self._levels = set(levels)
+        self._pending.clear()
+        QTextEdit.clear(self)
+        self._pending.extend(self._lines)
+        self.flush()
+
+    def spill_to(self, path: Optional[str], mirror: bool = False):
+        """path=None 关闭落盘"""
+        if self._spill is not None:
+            self._spill.close(); self._spill = None
+        self._mirror = True
+        if path:
+            self._spill = open(path, "a", encoding="utf-8", buffering=1 << 16)
+            self._mirror = mirror
+
+    def clear(self):
+        self._lines.clear(); self._pending.clear()
+        super().clear()
 
 
 # ---------- 定时器 ----------
@@ -336,7 +416,9 @@ class Ticker(QWidget):
         super().__init__(parent)
         self.timer = QTimer(self); self.timer.timeout.connect(self.tick)
         self.interval = interval_ms
-    def set_interval(self, ms): self.interval = ms
+    def set_interval(self, ms):
+        self.interval = ms
+        if self.timer.isActive(): self.timer.setInterval(ms)
     def start(self): self.timer.start(self.interval)
     def stop(self): self.timer.stop()
     def single(self): self.tick.emit()
@@ -0,0 +1,121 @@
+# worker.py
+# 后台仿真：Simulator 在独立进程（或线程）里推进，按固定周期发布不可变快照；
+# UI 只发命令（reset/start/pause/step）并轮询最新快照，不在 GUI 线程里跑仿真。
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+import multiprocessing as mp
+import queue
+import threading
+import time
+
+from sim import Simulator, scenario_program
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    cycles: int
+    instrs: int
+    macs: int
+    vecops: int
+    q_cube: int
+    q_vec: int
+    q_mte: int
+    bw: Tuple[Tuple[str, int], ...]          # 本周期内各通路最近一次的 bits/cycle
+    last_ctrl: Optional[Tuple[str, str]]     # (stage, name)
+    last_data: Optional[Tuple[str, str]]
+    ctrl_events: int                         # 自上次快照以来的事件数
+    data_events: int
+    running: bool
+    done: bool
+
+
+class _Agg:
+    def __init__(self): self.clear()
+    def clear(self):
+        self.ctrl = self.data = 0
+        self.last_ctrl = self.last_data = None
+        self.bw: Dict[str, int] = {}
+    def on_ctrl(self, stage, name):
+        self.ctrl += 1; self.last_ctrl = (stage, name)
+    def on_data(self, stage, name, meta):
+        self.data += 1; self.last_data = (stage, name)
+        if meta["kind"]: self.bw[meta["kind"]] = meta["bits_per_cycle"]
+
+
+def _snapshot(sim: Simulator, agg: _Agg, running: bool) -> Snapshot:
+    snap = Snapshot(sim.cycles, sim.pc, sim.macs, sim.vecops, sim.q_cube, sim.q_vec, sim.q_mte,
+                    tuple(agg.bw.items()), agg.last_ctrl, agg.last_data, agg.ctrl, agg.data,
+                    running, sim.finished())
+    agg.clear()
+    return snap
+
+
+def _serve(cmd_q, snap_q, period_s: float):
+    """工作循环：运行中每个周期尽量多推进，周期结束发布一次快照；空闲时阻塞等命令"""
+    sim = Simulator()
+    agg = _Agg()
+    sim.on_visit_ctrl, sim.on_visit_data = agg.on_ctrl, agg.on_data
+    sim.reset([])
+    running = False
+    while True:
+        try:
+            cmd = cmd_q.get_nowait() if running else cmd_q.get()
+        except queue.Empty:
+            cmd = None
+        if cmd is not None:
+            op = cmd[0]
+            if op == "quit": return
+            if op == "reset":
+                _, scenario, params, order = cmd
+                for k, v in params.items(): setattr(sim, k, v)
+                sim.reset(scenario_program(scenario, order=order, **params))
+                agg.clear(); running = False
+            elif op == "start": running = True
+            elif op == "pause": running = False
+            elif op == "step":
+                for _ in range(cmd[1]):
+                    if sim.finished(): break
+                    sim.step()
+            snap_q.put(_snapshot(sim, agg, running))
+            continue
+        # 运行中：一个发布周期内紧循环推进
+        deadline = time.perf_counter() + period_s
+        while not sim.finished():
+            for _ in range(256):
+                if sim.finished(): break
+                sim.step()
+            if time.perf_counter() > deadline: break
+        if sim.finished(): running = False
+        snap_q.put(_snapshot(sim, agg, running))
+
+
+class SimWorker:
+    """
+    use_process=True：独立进程（可用第二个核）；False：后台线程（调试用，受 GIL 限制）。
+    命令立即返回；poll() 取走队列中所有快照并返回最新的一个（没有则 None）。
+    """
+    def __init__(self, use_process: bool = True, period_s: float = 1 / 30):
+        if use_process:
+            ctx = mp.get_context("spawn")
+            self._cmd, self._snap = ctx.Queue(), ctx.Queue()
+            self._runner = ctx.Process(target=_serve, args=(self._cmd, self._snap, period_s), daemon=True)
+        else:
+            self._cmd, self._snap = queue.Queue(), queue.Queue()
+            self._runner = threading.Thread(target=_serve, args=(self._cmd, self._snap, period_s), daemon=True)
+        self._runner.start()
+
+    def reset(self, scenario: str, params: Dict, order: str = "MNK"):
+        self._cmd.put(("reset", scenario, dict(params), order))
+    def start(self): self._cmd.put(("start",))
+    def pause(self): self._cmd.put(("pause",))
+    def step(self, n: int = 1): self._cmd.put(("step", n))
+
+    def poll(self) -> Optional[Snapshot]:
+        last = None
+        while True:
+            try: last = self._snap.get_nowait()
+            except queue.Empty: return last
+
+    def close(self):
+        self._cmd.put(("quit",))
+        self._runner.join(timeout=1.0)